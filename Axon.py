@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+
+"""
+Axon.py
+
+An axon is modeled as a sequence of HexTile cross-sections (layers).
+Every layer of an axon has the same geometry;
+only the placement of strands differs from layer to layer.
+
+LayerStack keeps the geometry once, in a base HexTile,
+and one int32 permutation row per layer:
+row L is the move array (see Permutation.py) taking the strands
+of layer L-1 to their tiles in layer L.
+Layer 0 is the base arrangement and its row is the identity.
+Rows are held in fixed-size chunks so that appending never copies
+earlier layers; 10^4 layers of a 10^4 tile mesh take about 400 MB.
+
+Any layer can be materialized as a HexTile view on demand:
+    stack = LayerStack(base)
+    stack.append(Permutation.ofGroups(flat, offsets, len(base)))
+    print stack.hextile(1)
+
+Every stride layers the composite permutation from layer 0 is kept as
+a checkpoint, so the placement of a strand at any layer costs one
+checkpoint read plus fewer than stride scalar lookups,
+however long the axon.
+Trajectories of many strands through many layers are one gather per layer:
+    tiles = stack.trajectory(strands)       # (layers, strands) int32
+    xy = stack.trajectoryXY(strands)        # (layers, strands, 2) float
+and positions between layers are sampled the same way, at any depths:
+    xy = stack.sample(strands, depths)      # (strands, depths, 2) float
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from hashlib import (sha1)
+from numpy import (asarray, arange, empty, floor)
+from numpy import (float64, int32, int64)
+
+from Groups import (flatten)
+from Permutation import (Permutation)
+from Buffers import (strandCenters)
+
+class LayerStack(object):
+    """
+    LayerStack holds shared geometry and one permutation row per layer.
+    """
+
+    chunk = 256 # layers per allocation
+    stride = 64 # layers between prefix checkpoints
+
+    def __init__(self, base):
+        """
+        base is the HexTile whose geometry and initial strand placement
+        every layer shares; it is used as given and not modified.
+        """
+        self.base = base
+        self.tiles = len(base)
+        self.radius = base.radius
+        self.chunks = []
+        self.checkpoints = []
+        self.prefix = arange(self.tiles+1, dtype=int32)
+        self.layers = 0
+        self.append(Permutation.identity(self.tiles))
+
+    def __len__(self):
+        return self.layers
+
+    def row(self, layer):
+        """The int32 move row of a layer (a view into its chunk)."""
+        if not 0 <= layer < self.layers:
+            raise IndexError(layer)
+        chunk, offset = divmod(layer, LayerStack.chunk)
+        return self.chunks[chunk][offset]
+
+    def permutation(self, layer):
+        """The Permutation taking layer-1 to layer."""
+        return Permutation(self.row(layer))
+
+    def append(self, permutation):
+        """Add a layer reached from the last layer by permutation."""
+        move = getattr(permutation, 'move', permutation)
+        assert len(move) == self.tiles + 1
+        chunk, offset = divmod(self.layers, LayerStack.chunk)
+        if chunk == len(self.chunks):
+            self.chunks += [empty((LayerStack.chunk, self.tiles+1), dtype=int32)]
+        self.chunks[chunk][offset] = move
+        # Keep the running composite from layer 0, checkpointed every stride.
+        self.prefix = self.chunks[chunk][offset].take(self.prefix)
+        if self.layers % LayerStack.stride == 0:
+            self.checkpoints += [self.prefix.copy()]
+        self.layers += 1
+        return self
+
+    def appendGroups(self, groups):
+        """Add a layer reached by rotating groups (list or (flat, offsets))."""
+        flat, offsets = groups if isinstance(groups, tuple) else flatten(groups)
+        return self.append(Permutation.ofGroups(flat, offsets, self.tiles))
+
+    def placement(self, layer):
+        """
+        Composite permutation from layer 0 to layer;
+        placement(L)(t) is the tile in layer L of the strand on tile t
+        of layer 0.
+        """
+        return Permutation(self.advance(arange(self.tiles+1), layer))
+
+    def advance(self, tiles, layer):
+        """
+        Carry tiles of layer 0 (scalar or array) to their tiles in layer,
+        starting from the nearest checkpoint at or below layer.
+        """
+        if not 0 <= layer < self.layers:
+            raise IndexError(layer)
+        checkpoint = layer // LayerStack.stride
+        tiles = self.checkpoints[checkpoint][tiles]
+        for L in range(checkpoint * LayerStack.stride + 1, layer + 1):
+            tiles = self.row(L)[tiles]
+        return tiles
+
+    def where(self, strands, layer):
+        """Tile (or int32 array of tiles) holding strands at layer."""
+        return self.advance(self.base.store.tile[strands], layer)
+
+    def trajectory(self, strands, start=0, stop=None):
+        """
+        Tiles occupied by strands in layers start..stop-1
+        as an int32 array of shape (layers, strands).
+        """
+        stop = self.layers if stop is None else stop
+        strands = asarray(strands, dtype=int32)
+        path = empty((max(stop - start, 0), len(strands)), dtype=int32)
+        if len(path):
+            path[0] = self.where(strands, start)
+            for n, L in enumerate(range(start + 1, stop), 1):
+                path[n] = self.row(L).take(path[n-1])
+        return path
+
+    def trajectoryXY(self, strands, start=0, stop=None, txy=[1.5, 1.0]):
+        """Planar centers (see HexTile.xys) along the trajectory of strands."""
+        return self.base.xys(self.trajectory(strands, start, stop), txy)
+
+    def sample(self, strands, depths, curve='linear', txy=[1.5, 1.0]):
+        """
+        Planar positions of strands at fractional layers depths
+        (depth 2.25 is a quarter of the way from layer 2 to layer 3)
+        as a float64 array of shape (strands, depths, 2).
+        curve 'linear' joins consecutive tile centers by straight lines;
+        'catmull' passes a Catmull-Rom spline through them
+        (the end layers are repeated to close the spline).
+        Only the layers spanned by depths are walked.
+        """
+        strands = asarray(strands, dtype=int32)
+        depths = asarray(depths, dtype=float64).ravel()
+        if not len(depths):
+            return empty((len(strands), 0, 2))
+        assert 0 <= depths.min() and depths.max() <= self.layers - 1
+        last = self.layers - 1
+        layer = floor(depths).astype(int64).clip(0, max(last - 1, 0))
+        u = (depths - layer)[:, None]
+        start, stop = max(layer.min() - 1, 0), min(layer.max() + 3, self.layers)
+        # Gather (strands, depths, 2) directly from the strand-major path.
+        xy = self.trajectoryXY(strands, start, stop, txy).transpose(1, 0, 2)
+        if curve == 'linear':
+            weights = {0: 1 - u, 1: u}
+        else:
+            assert curve == 'catmull', curve
+            # Catmull-Rom as weights of the four surrounding centers.
+            uu, uuu = u * u, u * u * u
+            weights = {-1: 0.5 * (-uuu + 2*uu - u), 0: 0.5 * (3*uuu - 5*uu + 2),
+                    1: 0.5 * (-3*uuu + 4*uu + u), 2: 0.5 * (uuu - uu)}
+        at = 0
+        for n, weight in sorted(weights.items()):
+            at = at + xy[:, (layer + n).clip(0, last) - start] * weight
+        return at
+
+    def samples(self, strands, depths, curve='linear', chunk=1024,
+            txy=[1.5, 1.0]):
+        """
+        Generator of sample (see above) over chunks of depths,
+        yielding (depths, positions) so that a long axon can be
+        swept without holding every sample at once.
+        Increasing depths walk each layer only once or twice.
+        """
+        depths = asarray(depths, dtype=float64).ravel()
+        for n in range(0, len(depths), chunk):
+            part = depths[n:n+chunk]
+            yield part, self.sample(strands, part, curve, txy)
+
+    def centers(self, layer, strands=None, txy=[1.5, 1.0]):
+        """
+        Contiguous float32 planar centers of strands (default: every strand)
+        in a layer, ready for a vertex buffer (see Buffers.py).
+        """
+        return strandCenters(self, layer, strands, txy)
+
+    def hextile(self, layer, **kw):
+        """
+        Materialize a layer as a HexTile sharing the base geometry.
+        kw override the base options (rotation is never reapplied,
+        and the view is stored sparse exactly when the base is).
+        Only permutations are stored, so group and moved are left 0;
+        render with '--label' to see strand numbers.
+        """
+        from HexTile import (HexTile)
+        kw['--rotate'] = False
+        kw['--sparse'] = self.base.sparse
+        view = HexTile(sibling=self.base, **kw)
+        if view.sparse:
+            view.store.place(self.base.store.tile[1:])
+        else:
+            view.store.strand[:] = self.base.store.strand
+            view.store.tile[:] = self.base.store.tile
+            view.store.occupy()
+        self.placement(layer).applyTo(view.store)
+        return view
+
+    def digest(self):
+        """SHA-1 of every permutation row, to compare stacks cheaply."""
+        digest = sha1()
+        for layer in range(self.layers):
+            digest.update(self.row(layer).tobytes())
+        return digest.hexdigest()
+
+    @property
+    def nbytes(self):
+        return sum(chunk.nbytes for chunk in self.chunks)
+
+# An axon is a stack of cross-section layers.
+Axon = LayerStack
+
+if __name__ == "__main__":
+
+    from timeit import (default_timer)
+    from numpy import (concatenate)
+    from Spiral import (ringTiles)
+    from HexTile import (HexTile)
+
+    kw = {'--Rings': '0', '--Tiles': '7', '--tubulin': '7',
+          '--rotate': False, '--label': False}
+    base = HexTile(**kw)
+    stack = Axon(base)
+    stack.appendGroups([[1, 2, 3]])
+    stack.appendGroups([[2, 3, 4, 5, 6, 7]])
+    view = stack.hextile(1)
+    # Tile 1 now has tubulin 3, Tile 2 tubulin 1, and Tile 3 tubulin 2.
+    assert [view[t]['strand'] for t in [1, 2, 3]] == [-3, -1, -2]
+    assert view.store.R is base.store.R
+    view = stack.hextile(2)
+    assert view[-1] == 3 and view[-7] == 2
+    print stack.hextile(1, **{'--label': True})
+
+    tiles = 1 + 3 * 57 * 58
+    kw.update({'--Tiles': str(tiles), '--tubulin': str(tiles)})
+    stack = Axon(HexTile(**kw))
+    rings = Permutation.ofGroups(*flatten([ringTiles(r) for r in range(1, 58)]),
+            tiles=tiles)
+    t0 = default_timer()
+    for layer in range(1000):
+        stack.append(rings)
+    t1 = default_timer()
+    print '%d layers of %d tiles: %.1f MB, appended in %.1f ms' % (
+            len(stack), tiles, stack.nbytes/1e6, 1e3*(t1-t0))
+
+    # Compare checkpointed queries with composing every layer.
+    strands = arange(1, tiles+1, 7)
+    t0 = default_timer()
+    composed = arange(tiles+1, dtype=int32)
+    for L in range(1, 1000):
+        composed = stack.row(L).take(composed)
+    t1 = default_timer()
+    assert stack.where(tiles, 999) == composed[tiles]
+    t2 = default_timer()
+    path = stack.trajectory(strands)
+    xy = stack.trajectoryXY(strands)
+    t3 = default_timer()
+    assert (path[999] == composed[strands]).all()
+    assert (stack.where(strands, 1000) == path[-1]).all()
+    print 'point query %.1f us (full composition %.1f ms)' % (
+            1e6*(t2-t1), 1e3*(t1-t0))
+    print 'trajectory of %d strands x %d layers %s in %.1f ms' % (
+            len(strands), len(stack), xy.shape, 1e3*(t3-t2))
+
+    # Samples pass through the centers and between them along the curve.
+    depths = arange(0, 100, 1.0 / 16)
+    for curve in ['linear', 'catmull']:
+        t0 = default_timer()
+        at = stack.sample(strands, depths, curve)
+        t1 = default_timer()
+        assert at.shape == (len(strands), len(depths), 2)
+        assert abs(at[:, ::16] - xy[:100].transpose(1, 0, 2)).max() < 1e-9
+        parts = [part for depth, part in stack.samples(strands, depths, curve)]
+        assert (concatenate(parts, axis=1) == at).all()
+        print '%s: %d strands x %d depths in %.1f ms' % (
+                curve, len(strands), len(depths), 1e3*(t1-t0))
+    middle = stack.sample(strands, [2.5])[:, 0]
+    assert abs(middle - (xy[2] + xy[3]) / 2).max() < 1e-9
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""
+Buffers.py
+
+Vertex buffers of a HexTile mesh for OpenGL and other GPU renderers.
+
+Every function returns C-contiguous numpy arrays of float32 vertices
+or unsigned integer indices, computed for all tiles at once
+from the geometry columns of the store (built once, see TileStore.py),
+without per-tile Python work.
+numpy arrays expose the buffer protocol, so they can be handed as is
+to an upload call (glBufferData, a memoryview, a socket):
+    xy = centers(h)                     # (tiles, 2) float32, tile order
+    xy = strandCenters(stack, layer)    # (strands, 2) float32, strand order
+    vertices, indices = hexagon()       # one tile, for instanced drawing
+    vertices, indices = mesh(h)         # every tile, for a single draw
+Row n of centers(h) is tile n+1; row n of strandCenters is strand n+1.
+Coordinates are those of HexTile.xys: with the default txy=[1.5, 1.0]
+unit-edge hexagons lie edge to edge, flat side up as in the text rendering.
+hexagon() gives the six corners around (0, 0) and four triangles
+(a fan from corner 0) to be drawn once per instance offset by centers.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from math import (sqrt)
+from numpy import (arange, array, asarray, cos, empty, pi, sin)
+from numpy import (float32, int32, int64, uint16, uint32)
+
+s3o2 = sqrt(3.0) / 2.0
+fan = array([0, 1, 2, 0, 2, 3, 0, 3, 4, 0, 4, 5], dtype=uint16)
+
+def centers(hextile, tiles=None, txy=[1.5, 1.0]):
+    """
+    Planar centers (see HexTile.xys) of tiles (default: every tile)
+    as an (n, 2) float32 array.
+    """
+    store = hextile.store
+    tiles = arange(1, len(hextile)+1, dtype=int64) if tiles is None \
+            else asarray(tiles, dtype=int64)
+    R, G, B = (getattr(store, key)[tiles] for key in 'RGB')
+    xy = empty(tiles.shape + (2,), dtype=float32)
+    xy[..., 0] = R * (hextile.edge * txy[0])
+    xy[..., 1] = (B - G) * (hextile.edge * s3o2 * txy[1])
+    return xy
+
+def strandCenters(stack, layer, strands=None, txy=[1.5, 1.0]):
+    """
+    Planar centers of the tiles holding strands (default: every strand,
+    not the vacancies) in a layer of a LayerStack (see Axon.py),
+    as an (n, 2) float32 array.
+    """
+    base = stack.base
+    strands = arange(1, base.store.strands + 1, dtype=int32) if strands is None \
+            else asarray(strands, dtype=int32)
+    return centers(base, stack.where(strands, layer), txy)
+
+def hexagon(edge=1.0, txy=[1.5, 1.0]):
+    """
+    Corners of one hexagon around (0, 0), as a (6, 2) float32 array,
+    and the uint16 indices of the four triangles filling it.
+    """
+    angle = arange(6) * (pi / 3)
+    vertices = empty((6, 2), dtype=float32)
+    vertices[:, 0] = edge * cos(angle) * (txy[0] / 1.5)
+    vertices[:, 1] = edge * sin(angle) * txy[1]
+    return vertices, fan.copy()
+
+def mesh(hextile, tiles=None, txy=[1.5, 1.0]):
+    """
+    Corners of the hexagons of tiles (default: every tile)
+    as a (6n, 2) float32 array, and the uint32 indices
+    of their triangles, four per tile, as a (12n,) array.
+    """
+    xy = centers(hextile, tiles, txy)
+    corner, triangles = hexagon(hextile.edge, txy)
+    vertices = (xy[:, None, :] + corner).reshape(-1, 2)
+    indices = (arange(len(xy), dtype=uint32)[:, None] * 6 + triangles).ravel()
+    return vertices, indices
+
+if __name__ == "__main__":
+
+    from timeit import (default_timer)
+    from numpy import (allclose)
+    from HexTile import (HexTile)
+    from Axon import (LayerStack)
+    from Spiral import (fullRing, ringTiles)
+
+    kw = {'--Rings': '0', '--Tiles': '91', '--tubulin': '91',
+          '--rotate': False, '--label': False}
+    h = HexTile(**kw)
+    tiles = arange(1, 92)
+    xy = centers(h)
+    assert xy.dtype == float32 and xy.flags['C_CONTIGUOUS']
+    assert allclose(xy, h.xys(tiles))
+    assert len(memoryview(xy).tobytes()) == 91 * 2 * 4
+
+    # Neighbors share an edge: two corners coincide.
+    vertices, indices = mesh(h)
+    a, b = vertices[0:6], vertices[6*(h.neighbors(1)[0]-1):][:6]
+    shared = ((a[:, None] - b[None]) ** 2).sum(2) < 1e-10
+    assert shared.sum() == 2 and indices.max() == 6 * 91 - 1
+
+    # Strand centers follow a layer's placement.
+    stack = LayerStack(h)
+    stack.appendGroups([[1, 2, 3]])
+    assert allclose(stack.centers(1, [1, 2, 3]), h.xys(array([2, 3, 1])))
+    assert (h.centers() == xy).all()
+
+    # A partly filled mesh has rows for its strands only.
+    kw.update({'--Tiles': '19', '--tubulin': '7'})
+    stack = LayerStack(HexTile(**kw))
+    stack.appendGroups([[7, 19, 8]])
+    assert allclose(strandCenters(stack, 1), h.xys(array([1, 2, 3, 4, 5, 6, 19])))
+
+    tiles = fullRing(577)
+    kw.update({'--Tiles': str(tiles), '--tubulin': str(tiles)})
+    h = HexTile(**kw)
+    centers(h, [1]) # make the geometry columns
+    t0 = default_timer()
+    xy = centers(h)
+    t1 = default_timer()
+    vertices, indices = mesh(h)
+    t2 = default_timer()
+    stack = LayerStack(h)
+    stack.appendGroups([ringTiles(r) for r in range(1, 578)])
+    t3 = default_timer()
+    positions = strandCenters(stack, 1)
+    t4 = default_timer()
+    print '%d tiles: centers %.1f ms (%d bytes), mesh %.1f ms (%d + %d bytes)' % (
+            tiles, 1e3*(t1-t0), xy.nbytes, 1e3*(t2-t1),
+            vertices.nbytes, indices.nbytes)
+    print 'strand centers of layer 1 in %.1f ms' % (1e3*(t4-t3))
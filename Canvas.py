@@ -0,0 +1,493 @@
+#!/usr/bin/env python
+
+"""
+Canvas.py
+
+Text rendering of a HexTile on a numpy uint8 character canvas.
+
+Every character the list-of-lists renderer would write is computed at once:
+each tile contributes the 45 cells of its template and the cells of its
+labels, at offsets precomputed from its R and B-G coordinates.
+Where tiles overlap, the later write wins, as it does when tiles are
+stamped one by one in tile order.  Tiles are stamped batch at a time,
+in tile order, so later batches simply overwrite earlier ones;
+within a batch the writes are sorted by cell and write order
+and only the last write to each cell is made.
+Cells are int32 and nothing as large as the canvas is allocated
+besides the canvas itself.
+Decimal labels are formatted digit by digit as arrays.
+
+"Horns" are removed by comparing every line with the line above.
+Removing a horn only turns '\\' or '/' into ' ', which can only satisfy
+more horn conditions below it, never fewer, so repeating the whole-canvas
+comparison until nothing changes gives the line-by-line result
+(usually in two passes).
+Lines are framed and joined with one tobytes().
+    print Canvas(h).text()      # same as str(h)
+
+A Canvas keeps what it drew: the canvas as stamped, before horn removal,
+and as drawn.  When strands move, patch(tiles) redraws only the label
+cells of the given tiles: those cells are cleared and restamped from
+the few tiles whose templates or labels can reach them, last write
+winning, and horn removal is redone line by line below the cells that
+changed, for as long as anything still changes.
+HexTile keeps its Canvas and the tiles changed since it last rendered,
+so each frame of a sequence of rotations costs O(changed tiles)
+besides the final join.
+
+A viewport draws only a window of the rendering:
+    print Canvas(h).viewport(tile, 80, 24)
+The tiles reaching the window (and a margin above and beside it,
+enough for horn removal) are found in closed form from the spiral
+and only those are stamped, so the cost is set by the window.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from numpy import (arange, array, asarray, concatenate, cumsum, empty, frombuffer)
+from numpy import (full, in1d, indices, maximum, ones, repeat, tile)
+from numpy import (unique, where, uint8, int32, int64)
+
+from Spiral import (rgbsTile, tilesRing)
+from Scanline import (S, V, BS, FS, labels)
+
+def decimal(prefix, values):
+    """
+    Text of prefix followed by each of values in decimal, vectorized:
+    returns the lengths of the texts and all their characters.
+    """
+    values = asarray(values, dtype=int64)
+    digits = ones(len(values), dtype=int64)
+    power = 10
+    while len(values) and power <= values.max():
+        digits += values >= power
+        power *= 10
+    width = 1 + (digits.max() if len(values) else 0)
+    text = empty((len(values), width), dtype=uint8)
+    text[:, 0] = ord(prefix)
+    shift = maximum(digits[:, None] - arange(1, width), 0)
+    text[:, 1:] = values[:, None] // 10 ** shift % 10 + ord('0')
+    return digits + 1, text[arange(width) < (digits + 1)[:, None]]
+
+def located(hextile, R, d):
+    """
+    Tiles at columns R and rows d = B-G (with R + d even) of the mesh,
+    in closed form (see Spiral.rgbsTile), so that no spatial index is built;
+    positions off the mesh are dropped.
+    """
+    R, d = asarray(R, dtype=int64), asarray(d, dtype=int64)
+    G, B = -(R + d) // 2, (d - R) // 2
+    inside = maximum(maximum(abs(R), abs(G)), abs(B)) <= hextile.radius
+    tiles = rgbsTile(R[inside], G[inside], B[inside])
+    return unique(tiles[(tiles != 0) & (tiles <= hextile.tubes)])
+
+class Canvas(object):
+    """
+    Canvas renders one HexTile into a (height, width) uint8 array.
+    """
+
+    margin = 5 # lines and columns drawn around a window, see window
+    batch = 4096 # tiles stamped at once, see stamp
+
+    def __init__(self, hextile):
+        self.hextile = hextile
+        self.W, self.H = hextile.canvas()
+        self.x0, self.y0 = self.W / 2, self.H / 2
+        self.template = array([frombuffer(line, dtype=uint8)
+                for line in hextile.template])
+        self.label = hextile.kw['--label']
+        self.tiles = None # all tiles are drawn
+        self.stamped = self.drawn = None
+        self.width = 0 # of the widest label drawn
+
+    def corners(self, tiles):
+        """
+        Upper left cell (x, y) of the template of each tile, and its kind.
+        Templates are 9 columns wide at a pitch of 7 per R
+        and 5 lines high at a pitch of 2 per B-G (R+B-G is even),
+        so tiles of one kind, R mod 2 and B-G mod 3, never overlap.
+        """
+        store = self.hextile.store
+        R = store.values('R', tiles).astype(int64)
+        d = (store.values('B', tiles) - store.values('G', tiles)).astype(int64)
+        return self.x0 + 7 * R - 4, self.y0 - 2 * d + 2, 3 * (R % 2) + d % 3
+
+    def writes(self, tiles):
+        """
+        Cells (int32 flat indices), characters and write order
+        of every template and label character of tiles.
+        Writes falling outside the canvas are dropped.
+        """
+        tiles = asarray(tiles, dtype=int64)
+        x, y = (v.astype(int32) for v in self.corners(tiles)[:2])
+        h, w = self.template.shape
+        n = len(tiles)
+        # Templates: 45 cells per tile.
+        dy, dx = (v.ravel() for v in indices((h, w), dtype=int32))
+        X, Y = (x[:, None] + dx).ravel(), (y[:, None] + dy).ravel()
+        chars = tile(self.template.ravel(), n)
+        order = repeat(2 * arange(n, dtype=int32), h * w)
+        # Labels: text on template lines 1..3, from column 2.
+        owner, lines, lengths, text = self.texts(tiles)
+        if len(text):
+            self.width = max(self.width, int(lengths.max()))
+            who = repeat(arange(len(lengths), dtype=int32), lengths)
+            place = arange(len(text), dtype=int32) - repeat(
+                    (cumsum(lengths) - lengths).astype(int32), lengths)
+            o = owner[who].astype(int32)
+            X = concatenate((X, x[o] + 2 + place))
+            Y = concatenate((Y, y[o] + lines[who].astype(int32)))
+            chars = concatenate((chars, text))
+            order = concatenate((order, 2 * o + 1))
+        inside = (0 <= X) & (X < self.W) & (0 <= Y) & (Y < self.H)
+        if not inside.all():
+            X, Y, chars, order = (v[inside] for v in (X, Y, chars, order))
+        Y *= self.W
+        Y += X
+        return Y, chars, order
+
+    def last(self, cells, chars, order):
+        """The last write, in write order, to each cell written."""
+        span = int(order.max()) + 1 if len(order) else 1
+        latest = (cells.astype(int64) * span + order).argsort()
+        cells, chars = cells[latest], chars[latest]
+        final = ones(len(cells), dtype=bool)
+        final[:-1] = cells[1:] != cells[:-1]
+        return cells[final], chars[final]
+
+    def texts(self, tiles):
+        """
+        Labels of tiles: for each label, the index in tiles of its tile,
+        its template line and its length; and all their characters.
+        """
+        hextile = self.hextile
+        strand = hextile.store.values('strand', tiles)
+        index = arange(len(tiles))
+        if hextile.kw['--label']:
+            held = strand != 0
+            parts = [(index, 1, decimal('T', tiles)),
+                     (index[held], 2, decimal('S', strand[held])),
+                     (index, 3, decimal('R', tilesRing(tiles)))]
+        else:
+            index = index[(strand != 0) & (strand != tiles)]
+            texts = labels(hextile, tiles[index], full(len(index), 2))
+            parts = [(index, 2, (array([len(text) for text in texts], dtype=int64),
+                    frombuffer(''.join(texts), dtype=uint8)))]
+        return (concatenate([part[0] for part in parts]),
+                concatenate([full(len(part[0]), part[1], dtype=int64)
+                    for part in parts]),
+                concatenate([part[2][0] for part in parts]),
+                concatenate([part[2][1] for part in parts]))
+
+    def stamp(self, canvas, tiles=None):
+        """
+        Stamp tiles (default: all) into canvas; where writes overlap
+        the latest in tile order wins, as when stamping tile by tile.
+        Tiles are stamped a batch at a time, in order.
+        """
+        tiles = arange(1, self.hextile.tubes+1, dtype=int64) if tiles is None \
+                else asarray(tiles, dtype=int64)
+        flat = canvas.ravel()
+        for n in range(0, len(tiles), Canvas.batch):
+            cells, chars = self.last(*self.writes(tiles[n:n+Canvas.batch]))
+            flat[cells] = chars
+        return canvas
+
+    def dehorn(self, canvas):
+        """Remove horns, line by line in effect (see the module notes)."""
+        W = self.W
+        while True:
+            c, above = canvas[1:, 1:W-2], canvas[:-1]
+            cup = above[:, 1:W-2]
+            horn = ((c == BS) & (above[:, 0:W-3] == S) & (cup != FS)) | (
+                    (c == FS) & (above[:, 2:W-1] == S) & (cup != BS))
+            if not horn.any():
+                return canvas
+            c[horn] = S
+
+    def draw(self):
+        """The finished character canvas, kept with its stamped form."""
+        self.stamped = self.stamp(full((self.H, self.W), S, dtype=uint8),
+                self.tiles)
+        self.drawn = self.dehorn(self.stamped.copy())
+        return self.drawn
+
+    def patch(self, tiles):
+        """
+        Redraw the label cells of tiles, after their strands have moved,
+        in the kept canvas.
+        """
+        hextile, W = self.hextile, self.W
+        tiles = unique(asarray(tiles, dtype=int64))
+        tiles = tiles[(1 <= tiles) & (tiles <= hextile.tubes)]
+        if not len(tiles):
+            return self.drawn
+        x, y, kind = self.corners(tiles)
+        # Cells of the old and new labels: lines 1..3 from column 2.
+        lengths = self.texts(tiles)[2]
+        width = max(self.width, int(lengths.max()) if len(lengths) else 0)
+        cells = unique(((y[:, None, None] + arange(1, 4)[:, None]) * W +
+                x[:, None, None] + arange(2, 2 + width)).ravel())
+        # Tiles whose templates or labels can reach those cells.
+        store = hextile.store
+        R = store.values('R', tiles).astype(int64)
+        d = (store.values('B', tiles) - store.values('G', tiles)).astype(int64)
+        dR, dd = (v.ravel() for v in indices((3 + width // 7, 5)))
+        dR, dd = dR - 1, dd - 2
+        R, d = R[:, None] + dR, d[:, None] + dd
+        even = (R + d) % 2 == 0
+        R, d = R[even], d[even]
+        near = located(hextile, R, d)
+        # Restamp the cells, the latest write in tile order winning.
+        written, chars, order = self.writes(near)
+        keep = in1d(written, cells)
+        written, chars = self.last(written[keep], chars[keep], order[keep])
+        flat = self.stamped.ravel()
+        flat[cells] = S
+        flat[written] = chars
+        return self.rehorn(cells)
+
+    def rehorn(self, cells):
+        """
+        Redo horn removal in the drawn canvas from stamped cells
+        that changed, line by line down for as long as lines change.
+        """
+        W, H = self.W, self.H
+        stamped, drawn = self.stamped, self.drawn
+        pending = {}
+        for y, x in zip(*divmod(asarray(cells, dtype=int64), W)):
+            pending.setdefault(y, []).append(x)
+        while pending:
+            y = min(pending)
+            x = unique(concatenate([asarray(v).ravel() for v in pending.pop(y)]))
+            x = x[(0 <= x) & (x < W)]
+            c = stamped[y, x]
+            if y:
+                above = drawn[y-1]
+                inner = (1 <= x) & (x <= W-3)
+                at = where(inner, x, 1)
+                cup = above[at]
+                horn = inner & (
+                        ((c == BS) & (above[at-1] == S) & (cup != FS)) |
+                        ((c == FS) & (above[at+1] == S) & (cup != BS)))
+                c = where(horn, S, c)
+            changed = x[c != drawn[y, x]]
+            drawn[y, x] = c
+            if len(changed) and y+1 < H:
+                pending.setdefault(y+1, []).extend(
+                        [changed-1, changed, changed+1])
+        return drawn
+
+    def centre(self, center):
+        """
+        Character cell (x, y) of the center of a tile
+        or of a planar (x, y) position (see HexTile.xys).
+        """
+        if isinstance(center, (int, long)):
+            store = self.hextile.store
+            R = store.value('R', center)
+            d = store.value('B', center) - store.value('G', center)
+            return self.x0 + 7 * R, self.y0 - 2 * d + 4
+        x, y = center
+        return (self.x0 + int(round(7 * x / 1.5)),
+                self.y0 - int(round(2 * y / self.hextile.s3o2)) + 4)
+
+    def window(self, center, width, height):
+        """
+        A Canvas of width x height cells around center (see centre)
+        drawing only the tiles that reach it, found in closed form,
+        and enough of the lines and columns around it
+        for its horns to be removed as in the whole canvas.
+        """
+        margin = Canvas.margin
+        x, y = self.centre(center)
+        left, top = x - width // 2 - margin, y - height // 2 - margin
+        window = Canvas(self.hextile)
+        window.x0, window.y0 = self.x0 - left, self.y0 - top
+        window.W, window.H = width + 2 * margin, height + margin
+        # Templates at (x0+7R-4, y0-2d+2) are 9 by 5 and labels
+        # (at most a letter or two and two numbers no larger than
+        # the tile count) may run past them.
+        reach = max(8, 3 + 2 * len(str(self.hextile.tubes)))
+        R = arange(-((reach - left + self.x0 - 4) // 7),
+                (left + window.W - 1 - self.x0 + 4) // 7 + 1)
+        d = arange(-((top + window.H - 1 - self.y0 - 2) // 2),
+                (self.y0 + 6 - top) // 2 + 1)
+        R, d = (v.ravel() for v in (R[:, None] + 0 * d, d + 0 * R[:, None]))
+        R, d = R[(R + d) % 2 == 0], d[(R + d) % 2 == 0]
+        window.tiles = located(self.hextile, R, d)
+        window.margin = margin
+        return window
+
+    def viewport(self, center, width, height):
+        """
+        The framed text of the width x height window of the rendering
+        around center (a tile or planar position, see centre),
+        at a cost set by the window, not the mesh.
+        """
+        window = self.window(center, width, height)
+        body = window.draw()[window.margin:, window.margin:window.margin+width]
+        framed = empty((height, width + 3), dtype=uint8)
+        framed[:, 0] = framed[:, -2] = V
+        framed[:, 1:-2] = body
+        framed[:, -1] = ord('\n')
+        rule = '_' * width
+        return ''.join([' ' + rule + ' \n', framed.tobytes(), '|' + rule + '|\n'])
+
+    def text(self, canvas=None):
+        """The framed text rendering, as str(hextile)."""
+        if canvas is None:
+            canvas = self.draw() if self.drawn is None else self.drawn
+        body = canvas[:, 2:-1]
+        body = body[(body != S).any(1)]
+        framed = empty((len(body), body.shape[1] + 3), dtype=uint8)
+        framed[:, 0] = framed[:, -2] = V
+        framed[:, 1:-2] = body
+        framed[:, -1] = ord('\n')
+        rule = '_' * (self.W - 3)
+        text = [' ' + rule + ' \n', framed.tobytes(), '|' + rule + '|\n']
+        hextile = self.hextile
+        if hextile.verbose:
+            if hextile.kw['--rotate']:
+                text += ['Letters/Numbers are rotation groups/elements\n']
+            else:
+                text += ['T(tile#), strand(protein#), H(ring#)\n']
+                text += ['tubulin(%d), rings(%d)\n' % (
+                        hextile.tubes, hextile.radius+1)]
+        return ''.join(text)
+
+if __name__ == "__main__":
+
+    from timeit import (default_timer)
+    from HexTile import (HexTile)
+    from Spiral import (fullRing)
+
+    # The canvas gives exactly the lines of the original renderer.
+    cases = [
+        {'--Tiles': '1', '--tubulin': '1', '--label': True},
+        {'--Tiles': '37', '--tubulin': '37', '--label': True, '--rotate': True,
+         'rotates': [range(20, 38), [6, 7, 18, 17, 16], [4, 5, 14], [1, 2, 3]]},
+        {'--Tiles': '91', '--tubulin': '61', '--rotate': True,
+         'rotates': [range(38, 62), range(20, 38), [1, 2, 3]]},
+        {'--Tiles': str(fullRing(30)), '--tubulin': '2000', '--label': True},
+        ]
+    default = Canvas.batch
+    for kw in cases:
+        kw.update({'--Rings': '0'})
+        kw.setdefault('--rotate', False)
+        kw.setdefault('--label', False)
+        h = HexTile(**kw)
+        # Tiles overlapping across batches are stamped in order too.
+        for batch in [7, default]:
+            Canvas.batch = batch
+            assert Canvas(h).text() == h.rendering(), (kw['--Tiles'], batch)
+    print 'canvas renderings match the original for', [
+            kw['--Tiles'] for kw in cases]
+
+    # Patched renderings match fresh ones frame after frame.
+    from Cycles import (Cycles)
+    for label in [True, False]:
+        tiles = fullRing(12)
+        kw = {'--Rings': '0', '--Tiles': str(tiles), '--tubulin': str(tiles - 40),
+              '--rotate': False, '--label': label}
+        h = HexTile(**kw)
+        h.kw['--rotate'] = True
+        str(h)
+        for frame in range(20):
+            h.rotate(Cycles(12, seed=frame, tiles=tiles).flowers(0.05))
+            assert str(h) == Canvas(h).text(), (label, frame)
+            # Writes through tile records are redrawn too.
+            t = 2 * frame + 3
+            h[t]['strand'], h[t+1]['strand'] = h[t+1]['strand'], h[t]['strand']
+            assert str(h) == Canvas(h).text(), (label, frame)
+    print 'patched renderings match fresh ones, labelled and not'
+
+    # Changes are kept only once drawn, and only until a redraw is due.
+    h = HexTile(**kw)
+    h.kw['--rotate'] = True
+    for frame in range(50):
+        h.rotate(Cycles(12, seed=frame, tiles=tiles).flowers(0.05))
+    assert h.dirty == [] and h.drawing is None
+    str(h)
+    for frame in range(50):
+        h.rotate(Cycles(12, seed=frame, tiles=tiles).flowers(0.05))
+    assert h.dirty is None and str(h) == Canvas(h).text()
+
+    # A viewport is the same window cut from the whole canvas.
+    radius = 9
+    tiles = fullRing(radius)
+    for label in [True, False]:
+        kw = {'--Rings': '0', '--Tiles': str(tiles), '--tubulin': str(tiles - 30),
+              '--rotate': False, '--label': label}
+        h = HexTile(**kw)
+        h.kw['--rotate'] = True
+        h.rotate(Cycles(radius, seed=1, tiles=tiles).flowers(0.5))
+        canvas = Canvas(h)
+        whole = canvas.draw()
+        for center in range(1, fullRing(radius - 3) + 1, 3) + [(1.5, 0.9)]:
+            for width, height in [(7, 3), (20, 9), (41, 17)]:
+                x, y = canvas.centre(center)
+                left, top = x - width // 2, y - height // 2
+                lines = canvas.viewport(center, width, height).split('\n')
+                assert [line[1:-1] for line in lines[1:-2]] == [row.tobytes()
+                        for row in whole[top:top+height, left:left+width]]
+    print 'viewports match windows of the whole canvas'
+
+    def timed(function, times):
+        t0 = default_timer()
+        for n in range(times):
+            function()
+        return (default_timer() - t0) / times
+
+    print '%8s %12s %12s %12s %8s' % (
+            'tiles', 'original', 'scanline', 'canvas', 'speedup')
+    for tiles in [7, 91, 1000, 10000]:
+        kw = {'--Rings': '0', '--Tiles': str(tiles), '--tubulin': str(tiles),
+              '--rotate': False, '--label': True}
+        h = HexTile(**kw)
+        times = max(1, 2000 // tiles)
+        original = timed(h.rendering, times)
+        scanline = timed(lambda: ''.join(h.scanlines()), times)
+        canvas = timed(lambda: Canvas(h).text(), times)
+        print '%8d %10.2fms %10.2fms %10.2fms %7.1fx' % (tiles,
+                1e3*original, 1e3*scanline, 1e3*canvas, original/canvas)
+
+    # Frame by frame: a few small rotations per frame on a large mesh.
+    radius = 57
+    tiles = fullRing(radius)
+    kw = {'--Rings': '0', '--Tiles': str(tiles), '--tubulin': str(tiles),
+          '--rotate': False, '--label': False}
+    h = HexTile(**kw)
+    h.kw['--rotate'] = True
+    str(h)
+    frames = [Cycles(radius, seed=n).flowers(0.002) for n in range(50)]
+    t0 = default_timer()
+    for groups in frames:
+        h.rotate(groups)
+        str(h)
+    t1 = default_timer()
+    fresh = timed(lambda: Canvas(h).text(), 5)
+    print '%d tiles, %.0f tiles rotated per frame: %.2f ms patched, %.2f ms fresh' % (
+            tiles, sum(len(g[0]) for g in frames) / float(len(frames)),
+            1e3*(t1-t0)/len(frames), 1e3*fresh)
+
+    # A viewport costs the same however large the mesh, even the first.
+    for radius in [57, 577]:
+        tiles = fullRing(radius)
+        kw = {'--Rings': '0', '--Tiles': str(tiles), '--tubulin': str(tiles),
+              '--rotate': False, '--label': True}
+        h = HexTile(**kw)
+        t0 = default_timer()
+        canvas = Canvas(h)
+        canvas.viewport(tiles // 2, 80, 24)
+        cold = default_timer() - t0
+        seconds = timed(lambda: canvas.viewport(tiles // 2, 80, 24), 20)
+        print '%d tiles: an 80x24 viewport in %.2f ms (first %.2f ms)' % (
+                tiles, 1e3*seconds, 1e3*cold)
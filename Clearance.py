@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+
+"""
+Clearance.py
+
+Verification that strands keep a minimum distance between layers.
+
+Verify.py proves that no two strands meet: a combinatorial guarantee.
+A printed tube has a radius, so neighbouring tubes must keep their axes
+at least twice that radius apart.
+Between layer L and L+1 every strand is a straight 3D segment
+from its tile center (see HexTile.xys) at height L * pitch
+to its next tile center at (L+1) * pitch.
+All segments of a layer gap span the same heights, so two segments
+can only come close if their planar extents do:
+the midpoints of two segments closer than d lie within d plus
+the longest planar segment of the gap (one tile step, sqrt(3) edges,
+for a strand rotated or translated to a neighbor).
+Midpoints are hashed into a uniform grid of cells that wide,
+candidate pairs are those in the same or neighbouring cells,
+and the exact segment-to-segment distance of every candidate pair
+is computed at once (the closest points of two segments, clamped).
+Pairs closer than twice the tube radius are contacts.
+Layer gaps are checked independently, across a process pool.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from itertools import (imap, islice)
+from multiprocessing import (Pool)
+from timeit import (default_timer)
+from numpy import (arange, asarray, concatenate, cumsum, empty, floor, repeat)
+from numpy import (sqrt, where, int32, int64)
+
+from Tubes import (points)
+
+class Clearance(object):
+    """
+    Clearance is the result of a check.
+    It is true when no two strands came closer than the clearance.
+    minimum is the least distance found, at layer gap (layer-1, layer)
+    between strands; contacts lists (layer, strand, strand, distance)
+    of the first pairs too close (count of them all).
+    """
+
+    limit = 100 # contacts listed
+
+    def __init__(self, clearance):
+        self.clearance = clearance
+        self.minimum = float('inf')
+        self.layer = None
+        self.strands = None
+        self.contacts = []
+        self.count = 0
+        self.layers = 0
+        self.seconds = 0.0
+
+    def __nonzero__(self):
+        return self.count == 0
+
+    __bool__ = __nonzero__
+
+    @property
+    def rate(self):
+        return self.layers / self.seconds if self.seconds else 0.0
+
+    def add(self, layer, strands, pairs, distances):
+        """Take in the candidate pairs and distances of one layer gap."""
+        self.layers += 1
+        if len(distances):
+            n = distances.argmin()
+            if distances[n] < self.minimum:
+                self.minimum = float(distances[n])
+                self.layer = layer
+                self.strands = tuple(int(s) for s in strands[pairs[n]])
+        close = distances < self.clearance
+        self.count += int(close.sum())
+        for (a, b), d in zip(pairs[close][:Clearance.limit - len(self.contacts)],
+                distances[close]):
+            self.contacts += [(layer, int(strands[a]), int(strands[b]), float(d))]
+        return self
+
+    def __str__(self):
+        speed = '%d layers in %.3f s (%.0f layers/s)' % (
+                self.layers, self.seconds, self.rate)
+        closest = 'closest %.4f at layer %s, strands %s' % (
+                self.minimum, self.layer, self.strands)
+        if self:
+            return 'clearance %.4f kept, %s: %s' % (self.clearance, closest, speed)
+        return '%d contacts under %.4f, %s: %s' % (
+                self.count, self.clearance, closest, speed)
+
+def distances(p0, p1, q0, q1):
+    """
+    Least distances between 3D segments p0-p1 and q0-q1 (arrays (n, 3)),
+    from their closest points, clamped to the segments.
+    """
+    d1, d2, r = p1 - p0, q1 - q0, p0 - q0
+    a, e = (d1 * d1).sum(1), (d2 * d2).sum(1)
+    b, c, f = (d1 * d2).sum(1), (d1 * r).sum(1), (d2 * r).sum(1)
+    tiny = 1e-12
+    denominator = a * e - b * b
+    # Closest point on p for the infinite lines (any point if parallel).
+    s = where(denominator > tiny, (b * f - c * e) / where(
+            denominator > tiny, denominator, 1), 0).clip(0, 1)
+    t = where(e > tiny, (b * s + f) / where(e > tiny, e, 1), 0)
+    # Clamp t, then recompute s for the clamped t (q a point: t = 0).
+    low, high = (t < 0) | (e <= tiny), t > 1
+    t = t.clip(0, 1)
+    s = where(low, (-c / where(a > tiny, a, 1)).clip(0, 1), s)
+    s = where(high, ((b - c) / where(a > tiny, a, 1)).clip(0, 1), s)
+    s = where(a > tiny, s, 0)
+    gap = (p0 + s[:, None] * d1) - (q0 + t[:, None] * d2)
+    return sqrt((gap * gap).sum(1))
+
+def candidates(mid, cell):
+    """
+    Index pairs (i, j), i < j, of planar points mid (n, 2)
+    in the same or neighbouring cells of a uniform grid.
+    """
+    key = floor(mid / cell).astype(int64)
+    key -= key.min(0)
+    width = key[:, 1].max() + 3
+    hashed = key[:, 0] * width + key[:, 1]
+    order = hashed.argsort(kind='mergesort')
+    hashed = hashed[order]
+    parts = []
+    # Half of the neighbourhood, so each pair of cells is met once.
+    for dx, dy in [(0, 0), (0, 1), (1, -1), (1, 0), (1, 1)]:
+        target = hashed + dx * width + dy
+        lo, hi = hashed.searchsorted(target), hashed.searchsorted(target, 'right')
+        if (dx, dy) == (0, 0):
+            lo = arange(len(hashed)) + 1
+        count = (hi - lo).clip(0)
+        i = repeat(arange(len(hashed)), count)
+        j = arange(count.sum()) - repeat(cumsum(count) - count, count) + lo[i]
+        parts += [(i, j)]
+    i, j = (concatenate(part) for part in zip(*parts))
+    return empty((0, 2), dtype=int64) if not len(i) else \
+            asarray([order[i], order[j]]).T
+
+def checkGap(job):
+    """
+    Worker: candidate pairs (indices into the strands)
+    and their distances over one layer gap.
+    """
+    layer, before, after, clearance, pitch = job
+    p0 = points(before[None], [layer - 1], pitch)[0]
+    p1 = points(after[None], [layer], pitch)[0]
+    mid = (p0[:, :2] + p1[:, :2]) / 2
+    longest = sqrt(((p1[:, :2] - p0[:, :2]) ** 2).sum(1)).max()
+    pairs = candidates(mid, clearance + max(longest, sqrt(3.0)))
+    found = distances(p0[pairs[:, 0]], p1[pairs[:, 0]],
+            p0[pairs[:, 1]], p1[pairs[:, 1]])
+    return layer, pairs, found
+
+def clearStack(source, radius, pitch=2.0, workers=1, strands=None):
+    """
+    Check every layer gap of source (a LayerStack or LayerFile)
+    for tubes of a radius with layers pitch apart,
+    in parallel when workers > 1.
+    strands default to the occupied strands of source.base
+    (every tile of a LayerFile, which holds no occupancy).
+    """
+    t0 = default_timer()
+    base = getattr(source, 'base', None)
+    if strands is None:
+        strands = arange(1, (base.store.strands if base else source.tiles) + 1)
+    strands = asarray(strands, dtype=int32)
+    result = Clearance(2 * radius)
+
+    def jobs():
+        tiles = base.store.tile[strands] if base else strands
+        for layer in range(1, len(source)):
+            after = source.row(layer).take(tiles)
+            yield layer, tiles, after, 2 * radius, pitch
+            tiles = after
+
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        queue = jobs()
+        while True:
+            # Only a few layer gaps per worker are in flight at once.
+            some = list(islice(queue, 4 * max(workers, 1)))
+            if not some:
+                break
+            for found in (pool.imap(checkGap, some) if pool else imap(checkGap, some)):
+                result.add(found[0], strands, found[1], found[2])
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    result.seconds = default_timer() - t0
+    return result
+
+if __name__ == "__main__":
+
+    from numpy import (linspace, random, triu_indices)
+    from HexTile import (HexTile)
+    from Axon import (LayerStack)
+    from Weave import (weave)
+    from Permutation import (Permutation)
+    from Spiral import (fullRing)
+
+    # Segment distances agree with dense sampling of both segments.
+    random.seed(1)
+    p0, p1, q0, q1 = (random.rand(200, 3) for n in range(4))
+    q1[:20] = q0[:20] + (p1[:20] - p0[:20]) # parallel pairs
+    q0[20:40] = q1[20:40] # a point
+    exact = distances(p0, p1, q0, q1)
+    u = linspace(0, 1, 401)[:, None, None]
+    P = p0[None] + u * (p1 - p0)[None]
+    Q = q0[None] + u * (q1 - q0)[None]
+    sampled = sqrt(((P[:, None] - Q[None]) ** 2).sum(-1)).min(0).min(0)
+    assert (exact <= sampled + 1e-12).all() and (sampled - exact < 2e-3).all()
+
+    # The grid finds every pair within reach.
+    mid = random.rand(500, 2) * 20
+    pairs = set(map(tuple, candidates(mid, 1.5).tolist()))
+    near = sqrt(((mid[:, None] - mid[None]) ** 2).sum(-1)) < 1.5
+    assert all(((i, j) in pairs or (j, i) in pairs)
+            for i, j in zip(*near.nonzero()) if i < j)
+
+    # Strands swapping places meet; a weave keeps its clearance.
+    radius = 20
+    tiles = fullRing(radius)
+    kw = {'--Rings': '0', '--Tiles': str(tiles), '--tubulin': str(tiles),
+          '--rotate': False, '--label': False}
+    stack = weave(LayerStack(HexTile(**kw)), 200, seed=3)
+    print clearStack(stack, 0.25, workers=2)
+    before = stack.base.store.tile[1:]
+    after = stack.row(1).take(before)
+    layer, pairs, found = checkGap((1, before, after, 1.0, 2.0))
+    p0, p1 = points(before[None], [0], 2.0)[0], points(after[None], [1], 2.0)[0]
+    i, j = triu_indices(tiles, 1)
+    every = distances(p0[i], p1[i], p0[j], p1[j])
+    assert abs(found.min() - every.min()) < 1e-12 and (found < 1).sum() == (every < 1).sum()
+    swap = arange(tiles + 1, dtype=int32)
+    swap[[5, 6]] = [6, 5]
+    stack.append(Permutation(swap))
+    found = clearStack(stack, 0.25)
+    assert not found and found.minimum < 1e-9 and found.layer == len(stack) - 1
+    print found
+    print 'tubes of radius 0.5 at pitch 1:', clearStack(stack, 0.5, pitch=1.0)
+
+    # Only strands are checked on a partly filled mesh; a segment longer
+    # than one tile step (a vacancy sent back along a chain) widens the grid.
+    kw.update({'--Tiles': '19', '--tubulin': '7'})
+    h = HexTile(**kw)
+    step = [n for n in h.neighbors(7) if n > 7][0]
+    end = [n for n in h.neighbors(step) if n > 7 and n not in h.neighbors(7)][0]
+    partial = weave(LayerStack(h), 4, seed=2).appendGroups([[7, step, end]])
+    found = clearStack(partial, 0.25)
+    assert found.layers == 5 and set(found.strands) <= set(range(1, 8))
+    before = arange(1, 20, dtype=int32)
+    after = partial.row(5).take(before)
+    layer, pairs, found = checkGap((5, before, after, 1.0, 2.0))
+    p0, p1 = points(before[None], [4], 2.0)[0], points(after[None], [5], 2.0)[0]
+    i, j = triu_indices(19, 1)
+    every = distances(p0[i], p1[i], p0[j], p1[j])
+    assert (found < 1).sum() == (every < 1).sum()
+
+    tiles = fullRing(57)
+    kw.update({'--Tiles': str(tiles), '--tubulin': str(tiles)})
+    stack = weave(LayerStack(HexTile(**kw)), 100, seed=4)
+    print clearStack(stack, 0.25, workers=1)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+
+"""
+Cycles.py
+
+Generation of valid rotation groups for a mesh of any radius.
+
+Every layout produced is a set of disjoint simple cycles of three or more
+edge-adjacent tiles, returned in the flat/offsets form of Groups.py.
+Four layouts are offered:
+    rings    whole concentric rings of the mesh;
+    flowers  the six tiles around each center of a 7-tile lattice,
+             which tiles the plane with hexagonal flowers;
+    scatter  one ring of random radius 1..K around a random center,
+             or a triangle of three tiles, inside each cell of a lattice
+             of radius-K super-hexagons: only rings and triangles;
+    random   one random simple cycle of any shape inside each cell of
+             the same lattice: the boundary of a random disk of lattice
+             triangles grown in the cell (see disks).
+Super-hexagons of one lattice never overlap, so neither do their cycles.
+
+Tile centers are the vertices of a triangular lattice, and the boundary
+of any disk made of its triangles is a simple cycle of adjacent tiles.
+A disk grows from a random triangle by triangles across its edges,
+each allowed only if the triangles held around each of its three corners
+still form one unbroken fan (or the whole hexagon around the corner).
+That local test keeps the union a disk: it can neither pinch
+at a corner nor close around a hole.
+Triangles sharing no corner do not affect each other's test,
+so each step grows a random part of one class of such triangles,
+in every cell at once, until each disk reaches its random size.
+Random cycles therefore range over every simple cycle that fits in
+a cell, from triangles and rings to irregular blobs,
+at several times the cost of scatter (tens of growth steps a layer).
+The lattice origin moves randomly from call to call so that successive
+layers do not share cycle boundaries.
+Each cycle is rotated clockwise or anticlockwise at random.
+All randomness comes from a numpy RandomState that may be seeded.
+
+Everything is vectorized; a layer of 10^5 tiles takes tens of milliseconds.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from numpy import (array, arange, concatenate, cumsum, repeat, where, zeros)
+from numpy import (bincount, diff, floor, full, roll, int32, int64)
+from numpy.random import (RandomState)
+
+from Spiral import (neighbor, corner, fullRing, tilesRGB, tilesRing, rgbsTile)
+from Spiral import (ringTiles)
+from HexIndex import (HexIndex)
+from Groups import (members)
+
+_neighbor = array(neighbor, dtype=int64)
+_corner = array(corner, dtype=int64)
+
+class Cycles(object):
+    """
+    Cycles generates rotation group layouts for one mesh.
+    """
+
+    cells = {} # triangles of a radius-K super-hexagon, by K (see cell)
+    grows = 0.5 # chance that a triangle able to grow does (see disks)
+    steps = 2 # growth steps per triangle of a cell, at most (see disks)
+
+    def __init__(self, radius, seed=None, tiles=None):
+        """
+        radius is the mesh radius; tiles optionally limits the mesh
+        to tiles 1..tiles; seed makes the sequence of layouts repeatable.
+        """
+        self.radius = radius
+        self.tiles = fullRing(radius) if tiles is None else tiles
+        self.index = HexIndex.of(radius)
+        self.rng = RandomState(seed)
+
+    def rings(self, every=1):
+        """Every every-th complete ring of the mesh as one cycle each."""
+        groups = [ringTiles(ring) for ring in range(1, self.radius+1, every)
+                if fullRing(ring) <= self.tiles]
+        return self.finish(*self.pack(groups))
+
+    def flowers(self, density=1.0):
+        """Six-tile rings around the centers of a shifted 7-tile lattice."""
+        R, G, B = self.lattice(1)
+        k = zeros(len(R), dtype=int64) + 1
+        return self.cycles(R, G, B, k, density)
+
+    def scatter(self, K=3, density=1.0):
+        """One random ring or triangle inside each radius-K super-hexagon."""
+        R, G, B = self.lattice(K)
+        n = len(R)
+        # Ring radius k in 1..K, or 0 for a triangle.
+        k = self.rng.randint(0, K+1, n).astype(int64)
+        # A center offset that keeps the cycle inside its super-hexagon.
+        room = K - where(k == 0, 1, k)
+        pick = floor(self.rng.random_sample(n) * fullRing(room))
+        dR, dG, dB = tilesRGB(pick.astype(int64) + 1)
+        return self.cycles(R + dR, G + dG, B + dB, k, density)
+
+    def random(self, K=3, density=1.0):
+        """One random simple cycle inside each radius-K super-hexagon."""
+        R, G, B = self.lattice(K)
+        offset = Cycles.cell(K)[0]
+        local, length = self.disks(K, len(R))
+        owner = repeat(arange(len(R)), length)
+        tiles = self.index.tiles_at(R[owner] + offset[local, 0],
+                G[owner] + offset[local, 1], B[owner] + offset[local, 2])
+        return self.keep(tiles, owner, length, density)
+
+    @staticmethod
+    def cell(K):
+        """
+        Triangles of the radius-K super-hexagon around the origin,
+        whose vertices are its fullRing(K) tiles (index t-1 for spiral
+        tile t, RGB offsets in offset), cached by K:
+            offset    (tiles, 3) RGB offsets of the vertices;
+            corners   (triangles, 3) vertices of each triangle, in turn;
+            across    (triangles, 3) triangle across the edge from corner k
+                      to corner k+1, or the count of triangles if none;
+            slot      (triangles, 3) bit of each triangle in the fan
+                      (the six triangles around) of each of its corners;
+            whole     (64) whether a fan of triangles held, as six bits,
+                      is one unbroken run or the whole hexagon;
+            kinds     triangles in classes of which no two share a corner
+                      (seven classes, found greedily).
+        """
+        if K not in Cycles.cells:
+            V = fullRing(K)
+            offset = array(tilesRGB(arange(1, V+1))).T.astype(int64)
+            # Vertex v with consecutive neighbors j and j+1 spans a triangle.
+            a = offset[:, None] + _neighbor
+            b = offset[:, None] + roll(_neighbor, -1, axis=0)
+            inside = (tilesRing(rgbsTile(*a.transpose(2, 0, 1))) <= K) & (
+                    tilesRing(rgbsTile(*b.transpose(2, 0, 1))) <= K)
+            va = rgbsTile(*a.transpose(2, 0, 1)) - 1
+            vb = rgbsTile(*b.transpose(2, 0, 1)) - 1
+            v = arange(V)[:, None] + 0 * va
+            # Each triangle is met at its three vertices; keep its first.
+            triple = array([v, va, vb]).transpose(1, 2, 0)
+            first = (v < va) & (v < vb) & inside
+            corners = triple[first]
+            F = len(corners)
+            key = lambda p, q: p * V + q
+            edge = dict((key(p, q), f) for f, t in enumerate(corners.tolist())
+                    for p, q in zip(t, t[1:] + t[:1]))
+            across = array([[edge.get(key(q, p), F)
+                    for p, q in zip(t, t[1:] + t[:1])]
+                    for t in corners.tolist()], dtype=int64).reshape(F, 3)
+            rotated = [key(*pair) for pair in zip(v.ravel(), va.ravel())]
+            fan = array([edge.get(k, F) if ok else F
+                    for k, ok in zip(rotated, inside.ravel())],
+                    dtype=int64).reshape(V, 6)
+            slot = array([[1 << list(fan[p]).index(f) for p in t]
+                    for f, t in enumerate(corners.tolist())], dtype=int64)
+            bits = (arange(64)[:, None] >> arange(6)) & 1
+            whole = ((bits & ~roll(bits, 1, axis=1)).sum(1) == 1) | (
+                    bits.sum(1) == 6)
+            kind = []
+            for f in range(F):
+                near = set(kind[g] for g in fan[corners[f]].ravel() if g < f)
+                kind += [min(set(range(len(near) + 1)) - near)]
+            kinds = [arange(F)[array(kind) == k] for k in range(max(kind) + 1)]
+            Cycles.cells[K] = (offset, corners, across, slot, whole, kinds)
+        return Cycles.cells[K]
+
+    def disks(self, K, n):
+        """
+        Grow a random disk of triangles in each of n radius-K cells
+        (see the module notes) and walk its boundary:
+        returns the cell vertices of every boundary, concatenated,
+        and the length of each.
+        """
+        offset, corners, across, slot, whole, kinds = Cycles.cell(K)
+        F, V, rng, cells = len(corners), len(offset), self.rng, arange(n)
+        held = zeros((n, F+1), dtype=bool)
+        fans = zeros(n * V, dtype=int64)
+        f = rng.randint(F, size=n)
+        held[cells, f] = True
+        fans[(cells * V)[:, None] + corners[f]] |= slot[f]
+        count = zeros(n, dtype=int64) + 1
+        target = rng.randint(1, F+1, size=n)
+        grow = cells[count < target]
+        for step in range(Cycles.steps * F):
+            if not len(grow):
+                break
+            # Triangles of one random class (sharing no corner, see cell)
+            # across an edge of the disk grow independently
+            # where every fan stays one run.
+            kind = kinds[rng.randint(len(kinds))]
+            disk = held[grow]
+            g, k = (~disk[:, kind] & disk[:, across[kind]].any(2)).nonzero()
+            c, f = grow[g], kind[k]
+            ok = whole[fans[(c * V)[:, None] + corners[f]] | slot[f]].all(1)
+            ok &= rng.random_sample(len(f)) < Cycles.grows
+            c, f = c[ok], f[ok]
+            held[c, f] = True
+            fans[(c * V)[:, None] + corners[f]] |= slot[f]
+            count += bincount(c, minlength=n)
+            grow = grow[count[grow] < target[grow]]
+        # Boundary edges, all turning the same way around the disk, link
+        # each vertex to the next; walk from any boundary vertex back to it.
+        edge = held[:, :F, None] & ~held[:, across]
+        c, f, k = edge.nonzero()
+        after = full((n, V), -1, dtype=int64)
+        after[c, corners[f, k]] = corners[f, (k + 1) % 3]
+        length = (after >= 0).sum(1)
+        at = (after >= 0).argmax(1)
+        longest = length.max() if n else 0
+        path = zeros((n, longest), dtype=int64)
+        for p in range(longest):
+            path[:, p] = at
+            at = after[cells, at]
+        return path[arange(longest) < length[:, None]], length
+
+    def lattice(self, K):
+        """
+        Centers of the lattice of radius-K super-hexagons that can reach
+        the mesh, shifted by a random offset.
+        The lattice vectors (2K+1, -K, -K-1) and (K, K+1, -2K-1)
+        span cells of exactly fullRing(K) tiles.
+        """
+        reach = self.radius // (K + 1) + 2
+        a, b = (v.ravel() for v in
+                (arange(-reach, reach+1)[:, None] + zeros(2*reach+1, int64),
+                 zeros(2*reach+1, int64)[:, None] + arange(-reach, reach+1)))
+        shift = self.rng.randint(fullRing(K))
+        sR, sG, sB = (int(v[0]) for v in tilesRGB([shift + 1]))
+        R = a * (2*K+1) + b * K + sR
+        G = a * (-K) + b * (K+1) + sG
+        B = -R - G
+        near = abs(R) + abs(G) + abs(B) <= 2 * (self.radius + K)
+        return R[near], G[near], B[near]
+
+    def cycles(self, R, G, B, k, density):
+        """
+        Expand centers and ring radii into cycles,
+        drop cycles leaving the mesh, and thin to density.
+        Radius 0 stands for a triangle of the center and two neighbors.
+        """
+        n = len(R)
+        length = where(k == 0, 3, 6 * k)
+        offsets = concatenate(([0], cumsum(length)))
+        owner = repeat(arange(n), length)
+        p = arange(offsets[-1]) - offsets[:-1][owner]
+        ko = k[owner]
+        # Ring k: the closed form used for spiral numbering (Spiral.py).
+        kk = where(ko == 0, 1, ko)
+        j, m = p // kk, p % kk + 1
+        cR = ko * _corner[j % 6, 0] + m * _neighbor[j % 6, 0]
+        cG = ko * _corner[j % 6, 1] + m * _neighbor[j % 6, 1]
+        cB = ko * _corner[j % 6, 2] + m * _neighbor[j % 6, 2]
+        # Triangles: center, then two consecutive neighbors.
+        turn = self.rng.randint(6, size=n)[owner]
+        tri = ko == 0
+        step = (turn + p - 1) % 6
+        for c, axis in ((cR, 0), (cG, 1), (cB, 2)):
+            c[tri] = where(p[tri] == 0, 0, _neighbor[step[tri], axis])
+        tiles = self.index.tiles_at(R[owner] + cR, G[owner] + cG, B[owner] + cB)
+        return self.keep(tiles, owner, length, density)
+
+    def keep(self, tiles, owner, length, density):
+        """
+        Drop cycles (entries of tiles, by owner, of length) leaving the mesh,
+        and thin to density.
+        """
+        tiles[tiles > self.tiles] = 0
+        off = zeros(len(length), dtype=bool)
+        off[owner[tiles == 0]] = True
+        keep = ~off & (self.rng.random_sample(len(length)) < density)
+        return self.finish(tiles[keep[owner]], concatenate(
+                ([0], cumsum(length[keep]))).astype(int32))
+
+    def pack(self, groups):
+        flat = concatenate(groups).astype(int32) if groups else zeros(0, int32)
+        offsets = concatenate(([0], cumsum([len(g) for g in groups])))
+        return flat, offsets.astype(int32)
+
+    def finish(self, flat, offsets):
+        """Reverse a random half of the cycles (anticlockwise rotation)."""
+        lengths = diff(offsets)
+        owner, place = members(offsets)
+        reverse = self.rng.randint(2, size=len(lengths)).astype(bool)
+        order = where(reverse[owner],
+                (lengths[owner] - place) % lengths[owner], place)
+        flat = flat[offsets[:-1][owner] + order]
+        return flat.astype(int32), offsets.astype(int32)
+
+if __name__ == "__main__":
+
+    from timeit import (default_timer)
+    from Groups import (check)
+
+    for radius in [1, 2, 4, 10]:
+        cycles = Cycles(radius, seed=1)
+        for name in ['rings', 'flowers', 'scatter', 'random']:
+            flat, offsets = getattr(cycles, name)()
+            result = check(flat, offsets, radius)
+            assert result, '%s radius %d:\n%s' % (name, radius, result)
+
+    assert (Cycles(20, seed=5).random()[0] == Cycles(20, seed=5).random()[0]).all()
+
+    # Random cycles are any simple cycles fitting their cells,
+    # not only the rings and triangles of scatter, and never cross when woven.
+    from Verify import (verifyStack)
+    from HexTile import (HexTile)
+    from Axon import (LayerStack)
+    for K in [1, 2, 3, 5]:
+        cycles = Cycles(12, seed=K)
+        lengths = concatenate([diff(cycles.random(K)[1]) for n in range(20)])
+        assert check(*cycles.random(K), radius=12)
+        assert lengths.min() >= 3 and lengths.max() <= fullRing(K)
+        rings = set([3] + range(6, 6*K+1, 6))
+        assert set(diff(cycles.scatter(K)[1])) <= rings
+        if K > 1:
+            assert set(lengths) - rings
+    kw = {'--Rings': '0', '--Tiles': str(fullRing(12)),
+          '--tubulin': str(fullRing(12)), '--rotate': False, '--label': False}
+    stack = LayerStack(HexTile(**kw))
+    cycles = Cycles(12, seed=9)
+    for layer in range(50):
+        stack.appendGroups(cycles.random())
+    assert verifyStack(stack)
+
+    radius = 300
+    cycles = Cycles(radius, seed=0)
+    for name in ['rings', 'flowers', 'scatter', 'random']:
+        t0 = default_timer()
+        flat, offsets = getattr(cycles, name)()
+        t1 = default_timer()
+        assert check(flat, offsets, radius)
+        print '%-8s %d tiles: %6d cycles covering %6d tiles in %.1f ms' % (
+                name, fullRing(radius), len(offsets)-1, len(flat), 1e3*(t1-t0))
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+"""
+Groups.py
+
+Bulk validation of rotation groups.
+
+A layer's rotation groups are held flat, as in a CSR table:
+    flat    int32 tile numbers of every group, one group after another;
+    offsets int32 group boundaries, group g is flat[offsets[g]:offsets[g+1]].
+flatten(groups) converts the historical list of lists into this form.
+
+check(flat, offsets, radius) examines every group in one vectorized pass
+and returns a GroupCheck listing every violation found:
+    offmesh  tiles that are not on the mesh;
+    shared   tiles used more than once (across or within groups);
+    short    groups of fewer than three tiles;
+    broken   (group, tile, next tile) steps that are not edge-adjacent,
+             including the closing step from the last tile to the first;
+    blocked  chains whose last tile is occupied.
+Translation chains (see HexTile.translate) are open groups:
+closed=False (or a per-group bool array) drops the closing step,
+allows two tiles, and, given an Occupancy, requires the last tile empty.
+A chain is compiled like a cycle; only the vacancy at its end
+jumps back to its first tile.
+Disjointness is found by sorting the tiles used,
+adjacency with closed-form cube-coordinate differences of consecutive tiles
+(see Spiral.py), so the cost depends on the groups and not on the mesh.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from numpy import (asarray, arange, zeros, concatenate, cumsum, where)
+from numpy import (sort, unique, flatnonzero, maximum, repeat, diff, column_stack)
+from numpy import (int32, int64)
+
+from Spiral import (fullRing, tilesRGB)
+
+def flatten(groups):
+    """Convert a list of tile lists into (flat, offsets) int32 arrays."""
+    lengths = [len(group) for group in groups]
+    offsets = concatenate(([0], cumsum(lengths))).astype(int32)
+    flat = zeros(offsets[-1], dtype=int32)
+    for group, start in zip(groups, offsets):
+        flat[start:start+len(group)] = group
+    return flat, offsets
+
+def successors(offsets):
+    """
+    Position in flat of the next tile around each group's cycle;
+    the last tile of a group wraps to its first.
+    """
+    follow = arange(1, offsets[-1]+1, dtype=int64)
+    nonempty = diff(offsets) > 0
+    follow[offsets[1:][nonempty]-1] = offsets[:-1][nonempty]
+    return follow
+
+def members(offsets):
+    """
+    Group number and position within its group of every entry of flat.
+    """
+    lengths = diff(offsets)
+    owner = repeat(arange(len(lengths), dtype=int32), lengths)
+    place = arange(offsets[-1], dtype=int32) - offsets[:-1].take(owner)
+    return owner, place.astype(int32)
+
+class GroupCheck(object):
+    """
+    GroupCheck is the structured result of check().
+    It is true when no violation was found.
+    """
+
+    def __init__(self, offmesh, shared, short, broken, blocked=()):
+        self.offmesh = offmesh
+        self.shared = shared
+        self.short = short
+        self.broken = broken
+        self.blocked = blocked
+
+    @property
+    def valid(self):
+        return not (len(self.offmesh) or len(self.shared) or
+                len(self.short) or len(self.broken) or len(self.blocked))
+
+    def __nonzero__(self):
+        return self.valid
+
+    __bool__ = __nonzero__
+
+    def __str__(self):
+        if self.valid:
+            return 'groups valid'
+        report = []
+        if len(self.offmesh):
+            report += ['off mesh tiles: %s' % (list(self.offmesh))]
+        if len(self.shared):
+            report += ['shared tiles: %s' % (list(self.shared))]
+        if len(self.short):
+            report += ['groups too short: %s' % (list(self.short))]
+        if len(self.broken):
+            report += ['non-adjacent (group, tile, next): %s' % (
+                    [tuple(step) for step in self.broken])]
+        if len(self.blocked):
+            report += ['chains ending occupied: %s' % (list(self.blocked))]
+        return '\n'.join(report)
+
+def check(flat, offsets, radius, tiles=None, closed=True, occupancy=None):
+    """
+    Validate all groups of a layer at once.
+    tiles limits the mesh to tiles 1..tiles (default: the full radius).
+    closed is False (or False per group) for translation chains;
+    occupancy, when given, must show every chain ending in an empty tile.
+    """
+    flat = asarray(flat, dtype=int64)
+    offsets = asarray(offsets, dtype=int64)
+    if tiles is None:
+        tiles = fullRing(radius)
+    lengths = diff(offsets)
+    owner, _ = members(offsets)
+
+    onmesh = (1 <= flat) & (flat <= tiles)
+    offmesh = flat[~onmesh]
+    place = flat * onmesh
+
+    used = sort(place[onmesh])
+    shared = unique(used[1:][used[1:] == used[:-1]])
+
+    closed = asarray(closed, dtype=bool) | zeros(len(lengths), dtype=bool)
+    short = flatnonzero(lengths < where(closed, 3, 2))
+
+    after = successors(offsets)
+    follow = place[after]
+    ends = offsets[1:][lengths > 0] - 1
+    follow[ends[~closed[lengths > 0]]] = 0
+    R, G, B = tilesRGB(where(onmesh, place, 1))
+    dR = R[after] - R
+    dG = G[after] - G
+    dB = B[after] - B
+    step = maximum(maximum(abs(dR), abs(dG)), abs(dB))
+    bad = flatnonzero((step != 1) & onmesh & (follow != 0))
+    broken = column_stack((owner[bad], flat[bad], follow[bad]))
+
+    blocked = ()
+    if occupancy is not None:
+        chains = flatnonzero(~closed & (lengths > 0))
+        blocked = chains[occupancy[place[offsets[1:][chains] - 1]]]
+
+    return GroupCheck(offmesh, shared, short, broken, blocked)
+
+if __name__ == "__main__":
+
+    from timeit import (default_timer)
+    from operator import (add)
+    from Spiral import (ringTiles)
+
+    groups = [range(38, 62), range(20, 38), [6, 7, 18, 17, 16], [4, 5, 14], [1, 2, 3]]
+    assert check(*flatten(groups), radius=4)
+
+    groups = [[1, 2, 3], [3, 4, 5], [6, 7], [8, 9, 30], [70, 2, 10]]
+    result = check(*flatten(groups), radius=4)
+    assert not result
+    assert list(result.offmesh) == [70]
+    assert list(result.shared) == [2, 3]
+    assert list(result.short) == [2]
+    assert [tuple(b) for b in result.broken] == [(1, 5, 3), (3, 9, 30), (3, 30, 8)]
+    print result
+
+    # Translation chains: open, two or more tiles, ending in an empty tile.
+    from Occupancy import (Occupancy)
+    strand = zeros(62, dtype=int32)
+    strand[1:8] = 1
+    chains = [[2, 8], [3, 10, 9], [4, 5]]
+    result = check(*flatten(chains), radius=4, closed=False,
+            occupancy=Occupancy.of(strand))
+    assert not result and list(result.blocked) == [2] and not len(result.broken)
+    assert check(*flatten([[1, 2, 3], [4, 14]]), radius=4, closed=[True, False])
+
+    # Every ring of a large mesh as one layer of groups.
+    radius = 300
+    groups = [ringTiles(ring) for ring in range(1, radius+1)]
+    flat, offsets = flatten(groups)
+    t0 = default_timer()
+    result = check(flat, offsets, radius)
+    t1 = default_timer()
+    assert result
+    print '%d groups, %d tiles: checked in %.1f ms' % (
+            len(groups), len(flat), 1e3*(t1-t0))
+
+    # The historical check concatenated lists, which is quadratic.
+    groups = [list(group) for group in groups[:100]]
+    t0 = default_timer()
+    A = sorted(reduce(add, groups))
+    t1 = default_timer()
+    print 'first %d groups by list concatenation: %.1f ms' % (
+            len(groups), 1e3*(t1-t0))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+
+"""
+HexIndex.py
+
+Coordinate-to-tile index for a hexagonal mesh of a given radius.
+
+Since R+G+B == 0, the pair (R, G) identifies a tile.
+The pair is packed into one integer, (R+radius+1)*span + (G+radius+1),
+which addresses a dense int32 table holding the tile number
+(0 where the coordinate is off the mesh).
+The table has a one tile margin all around the mesh,
+so the neighbors of any tile are found by adding a fixed packed step
+to its key without bounds checks.
+Lookup is therefore a single array read for one tile
+and a single gather for any batch of tiles.
+
+Indices depend only on radius, so one is built per radius and shared:
+    index = HexIndex.of(radius)
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from numpy import (array, asarray, arange, zeros, concatenate, int32, int64)
+
+from Spiral import (neighbor, fullRing, tilesRGB)
+
+class HexIndex(object):
+    """
+    HexIndex maps RGB coordinates to tile numbers and tiles to neighbors.
+    """
+
+    cache = {} # radius: HexIndex, built once per radius
+
+    @staticmethod
+    def of(radius):
+        """Return the shared index for radius, building it on first use."""
+        index = HexIndex.cache.get(radius, None)
+        if index is None:
+            index = HexIndex.cache[radius] = HexIndex(radius)
+        return index
+
+    def __init__(self, radius):
+        self.radius = radius
+        self.span = 2 * radius + 3
+        self.tiles = fullRing(radius)
+        tiles = arange(1, self.tiles+1, dtype=int32)
+        R, G, B = tilesRGB(tiles)
+        # Per-tile coordinates and keys with slot 0 unused, as in TileStore.
+        self.R = concatenate(([0], R)).astype(int32)
+        self.G = concatenate(([0], G)).astype(int32)
+        self.B = concatenate(([0], B)).astype(int32)
+        self.key = self.pack(self.R, self.G).astype(int32)
+        self.table = zeros(self.span * self.span, dtype=int32)
+        self.table[self.key[1:]] = tiles
+        self.step = array(
+                [self.span * dR + dG for dR, dG, dB in neighbor], dtype=int32)
+        for column in (self.R, self.G, self.B, self.key, self.table):
+            column.flags.writeable = False
+
+    def pack(self, R, G):
+        """Packed integer key for (R, G); valid within one tile of the mesh."""
+        return (R + self.radius + 1) * self.span + (G + self.radius + 1)
+
+    def tile_at(self, R, G, B):
+        """Tile number at an RGB coordinate, or 0 if off the mesh."""
+        if R + G + B != 0 or max(abs(R), abs(G), abs(B)) > self.radius:
+            return 0
+        return int(self.table[self.pack(R, G)])
+
+    def tiles_at(self, R, G, B):
+        """Batched tile_at over coordinate arrays; 0 marks off-mesh entries."""
+        R, G, B = (asarray(v, dtype=int64) for v in (R, G, B))
+        inside = (R + G + B == 0)
+        for v in (R, G, B):
+            inside &= (-self.radius <= v) & (v <= self.radius)
+        tiles = zeros(R.shape, dtype=int32)
+        tiles[inside] = self.table[self.pack(R[inside], G[inside])]
+        return tiles
+
+    def neighbors(self, tile):
+        """On-mesh neighbors of a tile, in HexTile.neighbor order."""
+        found = self.table.take(self.key[tile] + self.step)
+        return [int(n) for n in found if n]
+
+    def neighbors_of(self, tiles):
+        """
+        Batched neighbors: an (n, 6) int32 array in HexTile.neighbor order
+        with 0 wherever a neighbor would be off the mesh.
+        """
+        keys = self.key.take(asarray(tiles, dtype=int64))
+        return self.table.take(keys[:, None] + self.step)
+
+if __name__ == "__main__":
+
+    from timeit import (default_timer)
+    from Spiral import (tileRGB)
+
+    index = HexIndex.of(3)
+    assert HexIndex.of(3) is index
+    for tile in range(1, index.tiles+1):
+        assert index.tile_at(*tileRGB(tile)) == tile
+    assert sorted(index.neighbors(1)) == range(2, 8)
+    assert len(index.neighbors(index.tiles)) == 3
+    assert index.tile_at(4, -4, 0) == 0
+    table = index.neighbors_of(arange(1, index.tiles+1))
+    for tile in range(1, index.tiles+1):
+        assert sorted(index.neighbors(tile)) == sorted(t for t in table[tile-1] if t)
+    print 'index agrees with closed-form spiral for radius', index.radius
+
+    index = HexIndex.of(577)
+    tiles = arange(1, index.tiles+1)
+    t0 = default_timer()
+    table = index.neighbors_of(tiles)
+    t1 = default_timer()
+    print '%d tiles: all neighbors in %.1f ms' % (index.tiles, 1e3*(t1-t0))
@@ -3,14 +3,7 @@
 """HexTile.py
 
 Usage:
-    HexTile.py \
-[(-v | --verbose)] \
-[(-T Tiles| --Tiles=Tiles)] \
-[(-t tubulin| --tubulin=tubulin)] \
-[(-r | --rotate)] \
-[(-g | --github)] \
-[(-R Rings| --Rings=Rings)] \
-[(-l | --label)]
+    HexTile.py [options]
     HexTile.py (-h | --help)
     HexTile.py (--version)
 
@@ -19,6 +12,17 @@ Options:
     -r --rotate                    Rotate some strands [default: False]
     -g --github                    Output in github Readme.md format
     -R Rings --Rings=Rings         Count of rings [default: 0]
+    -c CYCLES --cycles=CYCLES      Rotation groups: figures, rings,
+                                   flowers, scatter or random [default: figures]
+    -s SEED --seed=SEED            Seed for generated cycles [default: 0]
+    -L LAYERS --layers=LAYERS      Weave this many random layers [default: 0]
+    -w WORKERS --workers=WORKERS   Processes weaving layers or running jobs [default: 1]
+    -o FILE --output=FILE          Weave the layers into FILE (see LayerFile.py)
+    -i FILE --input=FILE           Read woven layers from FILE
+    -S --sparse                    Store only occupied tiles [default: False]
+    -V TILE --view=TILE            Print a window centered on a tile [default: 0]
+    -W SIZE --window=SIZE          Window columns x lines [default: 80x24]
+    -j FILE --jobs=FILE            Run each JSON line of FILE as a job
     -t TUBULIN --tubulin=TUBULIN   Strand count [default: 91]
     -T TILES --Tiles=TILES         Tile count [default: 91]
     -v --verbose                   Show details about execution
@@ -43,27 +47,41 @@ This emulates the character of tubulin pathways in axons.
 """
 
 from docopt import (docopt)
-from sys import (exit, argv)
+from sys import (exit, argv, stdout)
+from json import (loads)
+from multiprocessing import (Pool)
 from cPickle import (load, dump)
 from random import (seed, randint, random)
 from math import (sqrt, ceil)
 from itertools import (product)
 from pprint import (pprint)
 from scipy import (arange)
-from operator import (add)
+from numpy import (asarray, empty, concatenate, int32)
 from inspect import (getdoc, getmembers, getframeinfo, currentframe, isclass)
 from inspect import (isfunction, ismethod, stack)
 from datetime import (datetime)
 
 from Tag import (TAG)
 from SelfDoc import (classSelfDoc)
+from TileStore import (TileStore, Rings)
+from SparseStore import (SparseStore)
+from Spiral import (fullRing, radiusFor)
+from Groups import (flatten, check)
+from Cycles import (Cycles)
+from Axon import (LayerStack)
+from Weave import (weave)
+from Verify import (verifyStack)
+from LayerFile import (LayerFile)
+from Scanline import (scanlines)
+from Canvas import (Canvas)
+from Buffers import (centers)
 
 class Dictionary(dict):
     '''
     The goal of this class is to simplify updating of dictionaries.
     The implementation was going to expose keys as class members
     but it was not necessary at this time, so this class is
-    VESTIGIAL.
+    VESTIGIAL.  Tile records now live in TileStore columns.
     '''
     def __init__(self, **kw):
         self.update(kw)
@@ -77,7 +95,7 @@ class Dictionary(dict):
         self.update(kw)
         return [self[key] for key in keys]
 
-class HexTile(dict):
+class HexTile(object):
     """
     The goal of this class is to emulate the pathways of tubulin strands
     as they course through a neuron extension on their way to terminals.
@@ -85,29 +103,44 @@ class HexTile(dict):
     length of extension between bifurcations and/or terminals.
     A sequence of only a few Hex instances generally suffices.
 
+    Tiles are held in a TileStore of parallel int32 columns,
+    or with '--sparse' in a SparseStore of the occupied tiles only.
+    self[n] and self[-n] remain available as a view onto that store.
+
     See Test.test_000() for more detail.
     """
 
     neighbor = [[1,0,-1],[0,1,-1],[-1,1,0],[-1,0,1],[0,-1,1],[1,-1,0]]
     s3o2 = sqrt(3.0)/2.0
+    # Tile for rendering as text (note the "horns" atop the hexagon).
+    template = [
+            ' \\_____/ ',
+            ' /     \\ ',
+            '/       \\',
+            '\\       /',
+            ' \\_____/ ',
+            ]
     edge = 1.0 # unit scale for hexagon edge
-    fullRings = {N: 1+6*sum(range(N+1)) for N in range(30)} # >30 permitted
 
     def __init__(self, sibling=None, **kw):
         """
         Initialization includes inheriting a sibling's dictionary if exists
         otherwise instance uses the specified values from the arg dictionary.
+        A sibling also lends its geometry columns, which are never rebuilt,
+        and any kw given with a sibling override the inherited values.
         """
-        if sibling:
+        if sibling is not None:
             # inherit the sibling dictionary to continue its tubulin strands.
-            self.kw = sibling.kw
+            self.kw = dict(sibling.kw)
+            self.kw.update(kw)
+            kw = self.kw
         else:
             # otherwise start a new dictionary with specified values
             self.kw = kw
         rings = int(kw['--Rings'])
         # If rings are specified, tiles map to the calculated number for rings.
-        if rings and HexTile.fullRings.has_key(rings):
-            Tiles = HexTile.fullRings[rings]
+        if rings:
+            Tiles = fullRing(rings)
         else:
             Tiles = int(kw['--Tiles'])
         # tubulins must map to one per tile or less
@@ -118,24 +151,58 @@ class HexTile(dict):
         self.verbose = kw.get('--verbose', False)
         self.tubes = Tiles
         self.ring = {}
+        self.sparse = kw.get('--sparse', False)
+        self.drawing = None # the kept Canvas of the last rendering
+        self.dirty = [] # arrays of tiles changed since, None to redraw all
+        self.changed = 0 # count of tiles in dirty
+        if self.sparse:
+            self.store = SparseStore(Tiles, arange(1, int(kw['--tubulin'])+1))
+        else:
+            geometry = sibling.store if sibling is not None else None
+            self.store = TileStore(Tiles, geometry, int(kw['--tubulin']))
+        self.store.touched = self.touch
         self.needed(Tiles)
         self.generateRings()
         if self.kw['--rotate']:
             self.rotate(self.kw['rotates'])
 
+    def __getitem__(self, n):
+        return self.store[n]
+
+    def __setitem__(self, n, value):
+        self.store[n] = value
+
+    def touch(self, tiles):
+        """
+        Mark tiles as changed, so that the next rendering redraws them.
+        displace and writes through tile records (see TileStore.TileView)
+        do this; other changes to the store columns must.
+        Nothing is kept before the first rendering, and once a quarter
+        of the tiles changed everything is redrawn instead.
+        """
+        if self.drawing is None or self.dirty is None:
+            return self
+        tiles = asarray(tiles, dtype=int32).ravel()
+        self.changed += len(tiles)
+        if self.changed < self.tubes // 4:
+            self.dirty += [tiles]
+        else:
+            self.dirty = None
+        return self
+
+    def __contains__(self, n):
+        return n in self.store
+
+    def __len__(self):
+        return len(self.store)
+
     def needed(self, area):
         """
         Ensure that everything fits, and calculate the radius.
         """
-        assert type(area) == type(1)
-        assert 0 < area <= HexTile.fullRings.values()
-        ring, N, self.radius = 6, 1, 0
-        A = area - 1            # account for the center tile
-        while A > 0:
-            N += ring           # unused count
-            A -= ring           # remove tile count appropriate for ring
-            ring += 6           # each ring adds 6 more tiles
-            self.radius += 1    # count how many tiles from center
+        assert isinstance(area, (int, long))
+        assert 0 < area
+        self.radius = radiusFor(area)
         if self.verbose:
             print 'area', area, 'needs radius', self.radius
 
@@ -152,141 +219,247 @@ class HexTile(dict):
         S = HexTile.edge
         return (S * R * txy[0], S * (B - G) * HexTile.s3o2 * txy[1])
 
+    @staticmethod
+    def letters(group):
+        """
+        Label of a rotation group: A..Z, then AA, AB, ... as for
+        spreadsheet columns, so that any count of groups is labeled.
+        """
+        name, group = '', group + 1
+        while group:
+            group, letter = divmod(group - 1, 26)
+            name = chr(ord('A') + letter) + name
+        return name
+
+    def tile_at(self, R, G, B):
+        """
+        Tile number at an RGB coordinate, or 0 if there is no such tile.
+        """
+        return self.store.tile_at(R, G, B)
+
+    def tiles_at(self, R, G, B):
+        """
+        Batched tile_at over arrays of RGB coordinates.
+        """
+        return self.store.tiles_at(R, G, B)
+
+    def neighbors(self, tile):
+        """
+        Tile numbers of the (up to six) tiles sharing an edge with tile.
+        """
+        return self.store.neighbors(tile)
+
+    def neighbors_of(self, tiles):
+        """
+        Batched neighbors: one row of six tile numbers per tile,
+        in HexTile.neighbor order, with 0 where there is no neighbor.
+        """
+        return self.store.neighbors_of(tiles)
+
+    def xys(self, tiles, txy=[1.5, 1.0]):
+        """
+        Vectorized xy for an array of tile numbers (any shape);
+        returns float64 (x, y) pairs in a trailing axis of length 2.
+        The default scale places unit-edge hexagons edge to edge.
+        """
+        S = HexTile.edge
+        R, G, B = (getattr(self.store, key)[tiles] for key in 'RGB')
+        xy = empty(R.shape + (2,))
+        xy[..., 0] = S * R * txy[0]
+        xy[..., 1] = S * (B - G) * HexTile.s3o2 * txy[1]
+        return xy
+
+    def centers(self, tiles=None, txy=[1.5, 1.0]):
+        """
+        Contiguous float32 xys of tiles (default: every tile),
+        ready for a vertex buffer (see Buffers.py).
+        """
+        return centers(self, tiles, txy)
+
     def adjacent(self, t1, t2):
         """
         Tile adjacency requires that displacement along an RGB vector
         have values 0, +1, and -1.
-        UPDATED.
+        UPDATED to consult the shared CSR neighbor table for the radius.
         """
-        tile1, tile2 = self[t1], self[t2]
-        dR = tile2['R'] - tile1['R']; adR = abs(dR)
-        dG = tile2['G'] - tile1['G']; adG = abs(dG)
-        dB = tile2['B'] - tile1['B']; adB = abs(dB)
-        return (dR+dG+dB) == 0 and adR <= 1 and adG <= 1 and adB <= 1
+        return self.store.table.adjacent(t1, t2)
 
     def adjacents(self, tiles):
         """
         Review a sequence of tiles for adjacency.
         """
         shifted = tiles[1:] + tiles[:1]
-        for t1,t2 in zip(tiles, shifted):
-            if not self.adjacent(t1, t2):
-                if self.verbose:
-                    print 'NOT ADJACENT!', t1, t2
-                return False
+        adjacent = self.store.table.adjacents(tiles, shifted)
+        if not adjacent.all():
+            if self.verbose:
+                n = int(adjacent.argmin())
+                print 'NOT ADJACENT!', tiles[n], shifted[n]
+            return False
         if self.verbose:
             print 'YES ADJACENT!', tiles
         return True
 
+    def check(self, groups):
+        """
+        Validate rotation groups in one pass.
+        groups is a list of tile lists or a (flat, offsets) pair.
+        Returns a Groups.GroupCheck reporting every violation.
+        """
+        flat, offsets = groups if isinstance(groups, tuple) else flatten(groups)
+        return check(flat, offsets, self.radius, len(self))
+
     def rotate(self, groups):
         """
         Displace a sequence of tubulins to neighbors fulfilling adjacency.
 
-        groups is a list of sublists.
+        groups is a list of sublists (or a (flat, offsets) pair, see Groups.py).
         Each sublist is a sequence of Tile numbers.
         Each sequence is to be rotated or translated as a group.
         Tile numbers are expected to be unique over all sublists.
         Adjacent Tile numbers are expected to be neighbors.
 
         Make sure there are no shared tiles
+        and that every group is a cycle of adjacent tiles (see Groups.py).
         """
         if self.kw['--rotate']:
-            if groups:
-                A = sorted(reduce(add, groups))
-                B = sorted(list(set(A)))
-                assert A==B, str(A)+' != '+str(B)
-
-            for group, tiles in enumerate(groups):
-                self.adjacents(tiles)
-                indices = [self[-tile] for tile in tiles]
-                if self.verbose:
+            flat, offsets = groups if isinstance(groups, tuple) else flatten(groups)
+            if self.verbose:
+                for start, stop in zip(offsets[:-1], offsets[1:]):
+                    tiles = list(flat[start:stop])
                     print 'tiles', tiles
-                    print 'indices', indices
-                for moved, (tile, index) in enumerate(
-                        zip(tiles, indices[1:] + indices[0:1])):
-                    if self.verbose:
-                        print tile, index
-                    self[index]['strand'] = -tile
-                    self[index]['group'] = group
-                    self[index]['moved'] = moved
-                    self[-tile] = index
+                    self.adjacents(tiles)
+            self.displace((flat, offsets))
         return self
 
+    def translate(self, chains, groups=[]):
+        """
+        Translate chains of tubulins one step towards an empty tile.
+
+        chains is a list of sublists (or a (flat, offsets) pair).
+        Each chain is a sequence of two or more adjacent tiles
+        whose last tile is unoccupied;
+        the occupant of each tile moves to the next tile of its chain.
+        groups, when given, are rotated in the same step.
+        """
+        return self.displace(groups, chains)
+
+    def displace(self, groups=[], chains=[]):
+        """
+        Rotate groups and translate chains as one tile permutation.
+        All are validated at once: no tile may be shared,
+        every step must join neighbors, and every chain must end
+        in a tile that the occupancy bitmap shows empty.
+        """
+        flat, offsets = groups if isinstance(groups, tuple) else flatten(groups)
+        if len(chains):
+            links, ends = chains if isinstance(chains, tuple) else flatten(chains)
+            closed = arange(len(offsets) + len(ends) - 2) < len(offsets) - 1
+            flat = concatenate((flat, links)).astype(int32)
+            offsets = concatenate((offsets, ends[1:] + offsets[-1])).astype(int32)
+        else:
+            closed = True
+        if len(flat):
+            checked = check(flat, offsets, self.radius, len(self),
+                    closed, self.store.occupancy)
+            assert checked, str(checked)
+
+        # All groups and chains move at once (see TileStore.displace).
+        self.store.displace(flat, offsets)
+        return self.touch(flat)
+
     def generateRings(self):
         """
         generateRings makes the initial concentric rings of tiles.
         Initialization specifies how many rings are to be formed.
         This method performs the calculations necessary to
         actually create and label those things.
+
+        Geometry comes from the closed-form spiral (see Spiral.py).
+        Nothing is built here: the store makes each column on first use,
+        and self.ring maps rings to views listing tiles as they are read,
+        so a mesh of any size starts in constant time.
         """
-        rgb = [0,0,0]
-        tile = 1
-        ring = 0
-        elements = Dictionary(
-                R=0,G=0,B=0,ring=ring,strand=-tile,group=0,moved=0)
-        self.ring = {ring:[elements,]}
         tubulins = int(self.kw['--tubulin'])
         if self.verbose:
             print 'generating:', tubulins
-        self[tile] = self.ring[0][-1]
-        self[-tile] = tile
-        if self.kw.get('autonumber', False):
-            self[-tile] = tile  # tubulin assigned to tile of same number
-        delta = HexTile.neighbor
-
-        for ring in range(1,self.radius+1):
-            # Subtle algorithm.  Be cautious in modifying.
-            self.ring[ring] = []
-            r,g,b = rgb[0], rgb[1]-ring, rgb[2]+ring
-            for j in range(len(delta)):
-                for k in range(ring):
-                    tile += 1
-                    p = -(tile if tile <= tubulins else 0)
-                    if self.verbose:
-                        print tile, tubulins, p
-                    t = (r,g,b) = [
-                            u+delta[j][v]
-                            for u,v in
-                            zip([r,g,b], range(3))]
-                    elements = Dictionary(
-                            R=r,G=g,B=b,ring=ring,strand=p,group=0,moved=0)
-                    self.ring[ring] += [elements,]
-                    self[tile] = self.ring[ring][-1]
-                    self[-tile] = tile
-                    # Positive numbers are cardinal tile numbers
-                    # Negative numbers are tubulin fiber numbers
-                    # Initially, tubulins are in same-numbered tiles
-                    # Rotations move tubulins to different numbered tiles
+        # Positive numbers are cardinal tile numbers
+        # Negative numbers are tubulin fiber numbers
+        # Initially, tubulins are in same-numbered tiles (see TileStore)
+        # Rotations move tubulins to different numbered tiles
+        self.ring = Rings(self.store)
+
+    def canvas(self):
+        """
+        Width and height in characters of the text rendering.
+        The bias sizes small fields; larger ones need 14 columns
+        and 8 lines per ring to hold the outermost tiles.
+        """
+        rings = self.radius + 1
+        diameter = 1 + 2 * rings
+        W = (len(HexTile.template[0]) * diameter)
+        H = (len(HexTile.template) * diameter)
+        bias = [0.75, 0.867]
+        return max(int(bias[0]*W), 14 * rings - 1), max(int(bias[1]*H), 8 * rings + 6)
+
+    def scanlines(self):
+        """
+        Generate the text rendering line by line (see Scanline.py);
+        the lines are those of str(self).
+        """
+        return scanlines(self)
+
+    def render(self, sink=stdout, center=None, width=80, height=24):
+        """
+        Write the text rendering to a file-like sink one line at a time,
+        never holding more than a few lines of it.
+        Given a center (a tile number or a planar (x, y), see xys),
+        write only the width x height window around it,
+        drawing just the tiles that reach it (see Canvas.viewport).
+        """
+        if center is not None:
+            sink.write(Canvas(self).viewport(center, width, height))
+            return sink
+        for line in self.scanlines():
+            sink.write(line)
+        return sink
 
     def __str__(self):
+        """
+        The text rendering, drawn on a uint8 canvas (see Canvas.py).
+        The canvas is kept, and later renderings redraw only the tiles
+        changed since (see touch), unless so many changed
+        that drawing afresh is quicker.
+        """
+        drawing, dirty = self.drawing, self.dirty
+        self.dirty, self.changed = [], 0
+        if drawing is None or drawing.label != self.kw['--label']:
+            drawing = self.drawing = Canvas(self)
+        elif dirty is None:
+            drawing.draw()
+        elif dirty:
+            drawing.patch(concatenate(dirty))
+        return drawing.text()
+
+    def rendering(self):
         """
         This is very poorly implemented, but works for at least 800 tubulins!
+        It is kept as the reference for the canvas and scan line renderers.
         """
         rings = len(self.ring.keys())
-        diameter = 1 + 2 * rings
+        # Every tile is drawn, so make the geometry columns at once.
+        for key in ('R', 'G', 'B', 'ring'):
+            getattr(self.store, key)
         S, V, U, BS, FS = ' ', '|', '_', '\\', '/'
 
         # Create tile for insertion (note the "horns" atop the hexagon.
-        template = [list(line) for line in [
-                ' \_____/ ',
-                ' /     \\ ',
-                '/       \\',
-                '\       /',
-                ' \_____/ ',
-                ]]
+        template = [list(line) for line in HexTile.template]
         # Calculate its dimensions
         txy = [len(template[0]) ,len(template)]
         txy0 = [txy[0]/2, txy[1]/2]
 
         # Create printable field of sufficient size, and get its center
-        W = (txy[0] * diameter)
-        H = (txy[1] * diameter)
-
-        # Create a template scan line
-        # TODO get rid of need for bias
-        bias = [0.75, 0.867]
-        self.rendered = S * int(bias[0]*W)
-        self.rendered = [list(self.rendered) for _ in range(int(bias[1]*H))]
+        W, H = self.canvas()
+        self.rendered = [list(S * W) for _ in range(H)]
         self.xy0 = [ len(self.rendered[0])/2, len(self.rendered)/2 ]
 
         # (x0,y0) is the center of the fully rendered image
@@ -302,24 +475,20 @@ class HexTile(dict):
             # (x1,y1) offsets tile coordinates to center the tile
             x1, y1 = (-d for d in txy0)
 
-            # (xc,yc) is the cartesian coordinates for a given tile
-            xc, yc = self.xy(elements, txy)
-
-            # TODO Fix this truly gross way of adjusting offsets
-            xc *= [0.775, 0.78][xc>0]
-            yc *= [0.465, 0.46][yc>0]
+            # (xc,yc) is the character cell offset of a given tile:
+            # tiles interlock 7 columns apart along R
+            # and 2 lines apart along B-G.
+            R, G, B = elements(['R','G','B'])
+            xc, yc = 7 * R, 2 * (B - G)
 
             # (xs, ys) is the upper left corner of the numbered tile
             xs, ys = xc+x1, -(yc+y1)
 
             # Render hexagonal tiles into scan lines
+            x = x0+xs
             for y2 in range(txy[1]):
                 # y char subst coordinate is center + upper left + scanline
-                y = int(y0+ys+y2)
-                for x2 in range(txy[0]):
-                    # x char subst coordinate is center + upper left + scanline
-                    x = int(x0+xs+x2)
-                    self.rendered[y][x] = template[y2][x2]
+                self.rendered[y0+ys+y2][x:x+txy[0]] = template[y2]
 
             # Insert tile numbers in the scan-line rendered hexagons
             def putNumber(k, n, buf, x, y):
@@ -338,7 +507,7 @@ class HexTile(dict):
             elif strand and number != -strand:
                 # group, moved are the identifiers within the group
                 for key, value, offset in zip(
-                        [chr(ord('A')+group),],
+                        [HexTile.letters(group),],
                         [moved+1,],
                         [2,],
                         ):
@@ -356,19 +525,18 @@ class HexTile(dict):
                 if c == FS and cur == S and cup != BS:
                     self.rendered[y][x] = S
 
-        self.field = ''
-
         # Display the hexagons
         Vrule = V+U*(len(self.rendered[0])-3)+V
         Srule = S+U*(len(self.rendered[0])-3)+S
-        self.field += '%s\n' % Srule
+        field = ['%s\n' % Srule]
 
         for line in self.rendered:
             rendered = ''.join(line[2:-1])
             if not rendered.strip():
                 continue
-            self.field += V + rendered + V + '\n'
-        self.field += '%s\n' % Vrule
+            field += [V + rendered + V + '\n']
+        field += ['%s\n' % Vrule]
+        self.field = ''.join(field)
 
         # Announce how many tubulin fibers there are in how many rings
         if self.verbose:
@@ -394,15 +562,46 @@ if __name__ == "__main__":
             with TAG(name):
                 tag(text, *more)
 
-    def validate():
-        kw = docopt(__doc__, version="0.0.1")
+    def cycles(kw, Tiles):
+        """
+        Rotation groups for a mesh of Tiles tiles.
+        The 'figures' choice gives the hand-made loops that the
+        documentation figures describe (meaningful up to 61 tiles);
+        other choices are generated for any radius by Cycles.py.
+        """
+        tubes = int(kw.get('--tubulin', Tiles))
+        choice = kw.get('--cycles', 'figures')
+        if choice == 'figures':
+            # These are hand-generated loops of hexagons suitable for testing.
+            groups = {}
+            if tubes >= 61:
+                groups[61] = range(38,62)
+            if tubes >= 37:
+                groups[37] = range(20,38)
+            if tubes >= 18:
+                groups[18] = [6,7,18,17,16]
+            if tubes >= 14:
+                groups[14] = [4,5,14]
+            if tubes >= 3:
+                groups[3] = [1,2,3]
+            return groups.values()
+        assert choice in ['rings', 'flowers', 'scatter', 'random'], 'Choose: '+\
+                'figures, rings, flowers, scatter or random'
+        generator = Cycles(radiusFor(Tiles), int(kw.get('--seed', 0)), Tiles)
+        return getattr(generator, choice)()
+
+    def validate(kw=None):
+        kw = docopt(__doc__, version="0.0.1") if kw is None else kw
         verbose = kw['--verbose']
         Tiles = int(kw.get('--Tiles', 0))
         tubes = int(kw.get('--tubulin', 0))
         rotates = []
+        if int(kw.get('--Rings', 0)):
+            Tiles = fullRing(int(kw['--Rings']))
         assert \
-                Tiles in HexTile.fullRings.values(), \
-                'Choose: '+str(HexTile.fullRings)
+                Tiles == fullRing(radiusFor(Tiles)), \
+                'Choose a full mesh: 1+3N(N+1) tiles for N rings, e.g. ' + \
+                ', '.join(str(fullRing(N)) for N in range(8)) + ', ...'
         if Tiles or tubes:
             if Tiles and not tubes:
                 tubes = Tiles
@@ -415,17 +614,7 @@ if __name__ == "__main__":
             if verbose:
                 print 'kw', kw
 
-        groups = {
-                61:range(38,62),
-                37:range(20,38),
-                18:[6,7,18,17,16],
-                14:[4,5,14],
-                3:[1,2,3],
-                }
-        for key, val in groups.iteritems():
-            if tubes >= key:
-                rotates += [val,]
-        kw['rotates'] = rotates
+        kw['rotates'] = rotates = cycles(kw, Tiles)
         if verbose:
             print 'rotates', rotates
         return kw
@@ -433,27 +622,13 @@ if __name__ == "__main__":
     class Test(dict, classSelfDoc):
 
         def _common(self, name, doc, **kw):
-            groups = {}
             tubes = kw.get('--tubulin', kw.get('--Tiles', 37))
             kw['--tubulin'] = tubes
 
-            # These are hand-generated loops of hexagons suitable for testing.
-            if tubes >= 61:
-                groups[61] = range(38,62)
-            if tubes >= 37:
-                groups[37] = range(20,38)
-            if tubes >= 18:
-                groups[18] = [6,7,18,17,16]
-            if tubes >= 14:
-                groups[14] = [4,5,14]
-            if tubes >= 3:
-                groups[3] = [1,2,3]
-
-            rotates = []
-            for key, val in groups.iteritems():
-                if tubes >= key:
-                    rotates += [val,]
-            kw['rotates'] = rotates
+            # Hand-generated loops unless --cycles asks for generated ones.
+            options = dict(self)
+            options.update(kw)
+            kw['rotates'] = cycles(options, int(kw.get('--Tiles', tubes)))
             tag(name, 'h3')
             tag(doc)
             if not kw.get('ignore', False):
@@ -772,7 +947,7 @@ Each group of strands may be rotated separately in either direction.
             if (self.github_format):
                 self.github(tests)
 
-                with open('README.md', 'w') as html:
+                with open(self.get('path') or 'README.md', 'w') as html:
                     print>>html, TAG.final()
             else:
                 with TAG('html'):
@@ -780,7 +955,7 @@ Each group of strands may be rotated separately in either direction.
                     with TAG('body'):
                         self.github(tests)
 
-                with open('HexTile.html', 'w') as html:
+                with open(self.get('path') or 'HexTile.html', 'w') as html:
                     print>>html, TAG.final()
             return self
 
@@ -797,10 +972,120 @@ Each group of strands may be rotated separately in either direction.
                 exec('self.%s()' % test)
             return self
 
+    def weaving(kw, sink=stdout):
+        """
+        Weave --layers random layers over --workers processes,
+        report the result (see Weave.py) and verify it (see Verify.py).
+        With --output the layers stream into a file as they are woven.
+        """
+        layers, workers = int(kw['--layers']), int(kw['--workers'])
+        choice = kw['--cycles'] if kw['--cycles'] != 'figures' else 'random'
+        options = dict(kw)
+        options['--rotate'] = False
+        base = HexTile(**options)
+        start = datetime.now()
+        if kw['--output']:
+            stack = LayerFile.create(kw['--output'], base.radius, len(base),
+                    int(kw['--seed']))
+        else:
+            stack = LayerStack(base)
+        stack = weave(stack, layers, workers, int(kw['--seed']), choice)
+        elapsed = (datetime.now() - start).total_seconds()
+        print>>sink, 'woven %d %s layers of %d tiles by %d workers in %.3f s' % (
+                layers, choice, len(base), workers, elapsed)
+        print>>sink, 'digest', stack.digest()
+        print>>sink, verifyStack(stack, workers, base=base)
+        return stack
+
+    def reading(kw, sink=stdout):
+        """
+        Open the layers woven into --input and report them.
+        """
+        axon = LayerFile(kw['--input'])
+        print>>sink, 'read %d layers of %d tiles (radius %d, seed %d) from %s' % (
+                len(axon), axon.tiles, axon.radius, axon.seed, kw['--input'])
+        print>>sink, 'digest', axon.digest()
+        return axon
+
+    def viewing(kw, sink=stdout):
+        """
+        Print the --window around tile --view of the rotated mesh.
+        """
+        view = int(kw['--view'])
+        width, height = (int(n) for n in kw['--window'].split('x'))
+        assert 0 < view <= int(kw['--Tiles']), 'Choose a tile of the mesh'
+        HexTile(**kw).render(sink, view, width, height)
+
+    def running(kw, sink=stdout):
+        """Weave, read, view or report, as the options ask."""
+        if int(kw['--layers']):
+            weaving(kw, sink)
+        elif kw['--input']:
+            reading(kw, sink)
+        elif int(kw['--view']):
+            viewing(kw, sink)
+        else:
+            tests = Test(**kw)()
+
+    def job(defaults, line):
+        """
+        Run one line of a --jobs file: a JSON object of options
+        (long names, with or without dashes) over the defaults.
+        Output goes to its "path" (default: the report file or stdout).
+        """
+        kw = dict(defaults)
+        for key, value in loads(line).items():
+            key = key if key == 'path' or key.startswith('--') else '--' + key
+            assert key in kw or key == 'path', 'Unknown option %s' % key
+            kw[key] = value if isinstance(value, bool) else str(value)
+        kw = validate(kw)
+        start = datetime.now()
+        reports = not (int(kw['--layers']) or kw['--input'] or int(kw['--view']))
+        if kw.get('path') and not reports:
+            with open(kw['path'], 'w') as sink:
+                running(kw, sink)
+        else:
+            running(kw)
+        default = ('README.md' if kw['--github'] else 'HexTile.html') \
+                if reports else '-'
+        path = kw.get('path') or default
+        return path, (datetime.now() - start).total_seconds()
+
+    def jobbing(pair):
+        """Pool worker: one job, weaving in its own process only."""
+        defaults, line = pair
+        return job(dict(defaults, **{'--workers': '1'}), line)
+
+    def batch(kw):
+        """
+        Run every job of --jobs in this warm process, one after the other,
+        or over a pool of --workers processes.
+        """
+        defaults = docopt(__doc__, argv=[], version="0.0.1")
+        with open(kw['--jobs']) as source:
+            lines = [line for line in source if line.strip()]
+        workers = int(kw['--workers'])
+        start = datetime.now()
+        if workers > 1:
+            pool = Pool(workers)
+            done = pool.imap(jobbing, [(defaults, line) for line in lines])
+        else:
+            done = (job(defaults, line) for line in lines)
+        for n, (path, seconds) in enumerate(done, 1):
+            print 'job %d: %s in %.3f s' % (n, path, seconds)
+        if workers > 1:
+            pool.close()
+            pool.join()
+        print '%d jobs by %d workers in %.3f s' % (len(lines), workers,
+                (datetime.now() - start).total_seconds())
+
     def main():
         """This is the principal starting point of this script."""
         kw = validate()
 
-        tests = Test(**kw)()
+        if kw['--jobs']:
+            batch(kw)
+        else:
+            running(kw)
 
     main()
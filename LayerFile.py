@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+"""
+LayerFile.py
+
+A versioned binary file of the permutation rows of an axon (see Axon.py).
+
+Layout (little-endian):
+    header  one page (4096 bytes): the magic 'HEXAXON\\0', then int64
+            version, radius, tiles, layers, seed and stride
+            (bytes from one row to the next), then zeros;
+    rows    layers rows of tiles+1 int32, row L at header + L * stride.
+Rows of a page or more are padded to whole pages, so each starts on a
+page boundary and reading one touches only its own pages;
+smaller rows are packed.
+
+Rows are read through numpy.memmap, so opening a file of any size is
+instant and only the rows used are ever read:
+    axon = LayerFile('weave.axon')
+    move = axon.row(L)                  # int32, read from disk on use
+Layers are appended one row at a time, the layer count in the header
+following each row, so a weave can stream into a file as it is made
+(a LayerFile offers the append interface of LayerStack, see Weave.py):
+    weave(LayerFile.create('weave.axon', radius, tiles, seed), layers)
+    stack = LayerFile('weave.axon').stack(base)
+Like a LayerStack, a new file starts with the identity as layer 0.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from hashlib import (sha1)
+from numpy import (arange, asarray, dtype, frombuffer, memmap, zeros)
+
+from Permutation import (Permutation)
+
+magic = 'HEXAXON\0'
+version = 1
+page = 4096
+header = dtype([('magic', 'S8'), ('version', '<i8'), ('radius', '<i8'),
+        ('tiles', '<i8'), ('layers', '<i8'), ('seed', '<i8'), ('stride', '<i8')])
+row = dtype('<i4')
+
+class LayerFile(object):
+    """
+    LayerFile reads (and appends) the permutation rows of one axon file.
+    """
+
+    def __init__(self, path, mode='r'):
+        """Open an existing file, for reading ('r') or appending ('r+')."""
+        self.path, self.mode = path, mode
+        self.file = open(path, mode + 'b')
+        head = frombuffer(self.file.read(header.itemsize), dtype=header)[0]
+        assert head['magic'] == magic.rstrip('\0'), '%s is not an axon file' % path
+        assert head['version'] == version, '%s has version %d, not %d' % (
+                path, head['version'], version)
+        self.radius, self.tiles, self.layers, self.seed, self.stride = (
+                int(head[name]) for name in
+                ('radius', 'tiles', 'layers', 'seed', 'stride'))
+        self.mapped = None
+
+    @staticmethod
+    def create(path, radius, tiles, seed=0):
+        """A new file holding layer 0 (the identity), open for appending."""
+        size = (tiles + 1) * row.itemsize
+        stride = size if size < page else -(-size // page) * page
+        head = zeros(1, dtype=header)
+        head[0] = (magic, version, radius, tiles, 0, seed, stride)
+        with open(path, 'wb') as out:
+            out.write(head.tobytes())
+            out.write('\0' * (page - header.itemsize))
+        return LayerFile(path, 'r+').append(arange(tiles + 1))
+
+    def __len__(self):
+        return self.layers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.mapped = None
+        self.file.close()
+
+    def append(self, permutation):
+        """Write the row of a layer reached from the last layer."""
+        move = asarray(getattr(permutation, 'move', permutation), dtype=row)
+        assert len(move) == self.tiles + 1
+        self.file.seek(page + self.layers * self.stride)
+        self.file.write(move.tobytes())
+        self.file.write('\0' * (self.stride - move.nbytes))
+        self.layers += 1
+        self.file.seek(header.fields['layers'][1])
+        self.file.write(asarray(self.layers, dtype='<i8').tobytes())
+        self.file.flush()
+        return self
+
+    def rows(self):
+        """Every row, as a (layers, tiles+1) int32 view of the mapped file."""
+        if self.mapped is None or len(self.mapped) != self.layers:
+            self.mapped = memmap(self.path, dtype=row, mode='r', offset=page,
+                    shape=(self.layers, self.stride // row.itemsize))
+        return self.mapped[:, :self.tiles + 1]
+
+    def row(self, layer):
+        """The int32 move row of a layer, read from the file on use."""
+        if not 0 <= layer < self.layers:
+            raise IndexError(layer)
+        return self.rows()[layer]
+
+    def permutation(self, layer):
+        """The Permutation taking layer-1 to layer."""
+        return Permutation(self.row(layer))
+
+    def stack(self, base):
+        """A LayerStack (see Axon.py) on base holding every layer."""
+        from Axon import (LayerStack)
+        assert len(base) == self.tiles
+        stack = LayerStack(base)
+        rows = self.rows()
+        for layer in range(1, self.layers):
+            stack.append(rows[layer])
+        return stack
+
+    def digest(self):
+        """SHA-1 of every row, as LayerStack.digest."""
+        digest = sha1()
+        for layer in range(self.layers):
+            digest.update(self.row(layer).tobytes())
+        return digest.hexdigest()
+
+def save(stack, path, seed=0):
+    """Write every layer of a LayerStack to a new file."""
+    axon = LayerFile.create(path, stack.radius, stack.tiles, seed)
+    for layer in range(1, len(stack)):
+        axon.append(stack.row(layer))
+    axon.close()
+    return path
+
+if __name__ == "__main__":
+
+    from os import (remove, rmdir, path as ospath)
+    from numpy import (sort)
+    from tempfile import (mkdtemp)
+    from timeit import (default_timer)
+    from HexTile import (HexTile)
+    from Axon import (LayerStack)
+    from Weave import (weave)
+    from Spiral import (fullRing)
+
+    folder = mkdtemp()
+    name = ospath.join(folder, 'weave.axon')
+
+    # A saved stack reads back row for row.
+    radius = 5
+    tiles = fullRing(radius)
+    kw = {'--Rings': '0', '--Tiles': str(tiles), '--tubulin': str(tiles),
+          '--rotate': False, '--label': False}
+    base = HexTile(**kw)
+    stack = weave(LayerStack(base), 20, seed=3)
+    save(stack, name, seed=3)
+    axon = LayerFile(name)
+    assert (len(axon), axon.radius, axon.tiles, axon.seed) == (21, radius, tiles, 3)
+    assert axon.digest() == stack.digest() == axon.stack(base).digest()
+    assert axon.stride == (tiles + 1) * 4
+
+    # Weaving streams straight into a file, appending as layers arrive.
+    weave(LayerFile(name, 'r+'), 10, seed=3)
+    weave(stack, 10, seed=3)
+    axon = LayerFile(name)
+    assert len(axon) == 31 and axon.digest() == stack.digest()
+    try:
+        open(name, 'r+b').write('HEXTILE')
+        LayerFile(name)
+    except AssertionError as error:
+        print error
+
+    # Rows of a large mesh are page aligned and opened without reading.
+    radius = 300
+    tiles = fullRing(radius)
+    t0 = default_timer()
+    with LayerFile.create(name, radius, tiles, seed=1) as axon:
+        weave(axon, 40, seed=1)
+    t1 = default_timer()
+    axon = LayerFile(name)
+    rows = axon.rows()
+    t2 = default_timer()
+    move = axon.row(33).copy()
+    t3 = default_timer()
+    assert axon.stride % page == 0 and (sort(move) == arange(tiles + 1)).all()
+    print '%d layers of %d tiles: %d MB woven to file in %.2f s' % (
+            len(axon), tiles, ospath.getsize(name) >> 20, t1-t0)
+    print 'opened in %.3f ms, layer 33 read in %.3f ms' % (
+            1e3*(t2-t1), 1e3*(t3-t2))
+    remove(name)
+    rmdir(folder)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+"""
+NeighborTable.py
+
+Compressed-sparse-row adjacency of a hexagonal mesh of a given radius.
+
+Every mesh of one radius has the same topology,
+so the table is built once per radius and cached for the process:
+    table = NeighborTable.of(radius)
+The neighbors of tile t are indices[indptr[t]:indptr[t+1]],
+listed in HexTile.neighbor order.
+Row 0 is empty so that tile numbers index indptr directly.
+Both arrays are int32 and read-only.
+
+A table may be placed in shared memory by one process
+and attached by name in others without copying:
+    name = table.share()                     # parent
+    table = NeighborTable.attach(name, radius) # worker
+multiprocessing.shared_memory is used when available;
+otherwise the arrays are placed in a memory-mapped file
+in /dev/shm (or the temporary directory) under the returned name.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+import os
+from tempfile import (gettempdir)
+from numpy import (ndarray, memmap, asarray, arange, zeros, concatenate)
+from numpy import (cumsum, where, int32, int64)
+
+from Spiral import (fullRing)
+from HexIndex import (HexIndex)
+
+try:
+    from multiprocessing.shared_memory import (SharedMemory)
+except ImportError:
+    SharedMemory = None
+
+class NeighborTable(object):
+    """
+    NeighborTable is the read-only CSR adjacency shared by meshes of a radius.
+    """
+
+    cache = {} # radius: NeighborTable, built once per radius
+
+    @staticmethod
+    def of(radius):
+        """Return the shared table for radius, building it on first use."""
+        table = NeighborTable.cache.get(radius, None)
+        if table is None:
+            table = NeighborTable.cache[radius] = NeighborTable(radius)
+        return table
+
+    @staticmethod
+    def sizes(radius):
+        """Lengths of indptr and indices for a radius."""
+        tiles = fullRing(radius)
+        # Each of the 3r(3r+1) shared edges is listed once from each end.
+        return tiles + 2, 6 * radius * (3 * radius + 1)
+
+    def __init__(self, radius, indptr=None, indices=None):
+        """
+        Build the table from the HexIndex of radius,
+        or wrap existing indptr/indices buffers (see attach).
+        """
+        self.radius = radius
+        self.tiles = fullRing(radius)
+        self.shared = None
+        if indptr is None:
+            tiles = arange(1, self.tiles+1)
+            table = HexIndex.of(radius).neighbors_of(tiles)
+            present = table != 0
+            indptr = concatenate(([0, 0], cumsum(present.sum(1))))
+            indptr = indptr.astype(int32)
+            indices = table[present].astype(int32)
+        self.indptr, self.indices = indptr, indices
+        self.indptr.flags.writeable = False
+        self.indices.flags.writeable = False
+
+    def row(self, tile):
+        """Neighbors of tile as a read-only view (no copy)."""
+        return self.indices[self.indptr[tile]:self.indptr[tile+1]]
+
+    def degree(self, tile):
+        return int(self.indptr[tile+1] - self.indptr[tile])
+
+    def adjacent(self, t1, t2):
+        """True if tiles t1 and t2 share an edge."""
+        return t2 in self.row(t1)
+
+    def adjacents(self, t1, t2):
+        """
+        Vectorized adjacent over equal length arrays of tile pairs.
+        Returns a boolean array.
+        """
+        t1, t2 = asarray(t1, dtype=int64), asarray(t2, dtype=int64)
+        if not len(self.indices):
+            return zeros(t1.shape, dtype=bool)
+        start = self.indptr.take(t1)
+        degree = self.indptr.take(t1 + 1) - start
+        slot = arange(6)
+        valid = slot < degree[..., None]
+        found = self.indices.take(where(valid, start[..., None] + slot, 0))
+        return ((found == t2[..., None]) & valid).any(-1)
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes
+
+    def share(self):
+        """
+        Copy the table into named shared memory and return the name.
+        Memory is released by unshare() in the process that shared it.
+        """
+        if self.shared is None:
+            size = self.nbytes
+            if SharedMemory is not None:
+                self.shared = SharedMemory(create=True, size=max(size, 1))
+                name, buf = self.shared.name, self.shared.buf
+            else:
+                folder = '/dev/shm' if os.path.isdir('/dev/shm') else gettempdir()
+                name = os.path.join(folder, 'NeighborTable.%d.%d' % (
+                        self.radius, os.getpid()))
+                buf = self.shared = memmap(
+                        name, dtype='uint8', mode='w+', shape=(max(size, 1),))
+            split = self.indptr.nbytes
+            ndarray(self.indptr.shape, int32, buf, 0)[:] = self.indptr
+            ndarray(self.indices.shape, int32, buf, split)[:] = self.indices
+            self.name = name
+        return self.name
+
+    def unshare(self):
+        """Release shared memory created by share()."""
+        if self.shared is not None:
+            if SharedMemory is not None:
+                self.shared.close()
+                self.shared.unlink()
+            else:
+                del self.shared
+                os.remove(self.name)
+            self.shared = None
+
+    @staticmethod
+    def attach(name, radius):
+        """
+        Attach to a table shared by another process
+        and make it this process's table for radius.
+        """
+        nindptr, nindices = NeighborTable.sizes(radius)
+        split = nindptr * 4
+        if SharedMemory is not None:
+            shared = SharedMemory(name=name)
+            buf = shared.buf
+        else:
+            shared = buf = memmap(name, dtype='uint8', mode='r')
+        indptr = ndarray((nindptr,), int32, buf, 0)
+        indices = ndarray((nindices,), int32, buf, split)
+        table = NeighborTable(radius, indptr, indices)
+        table.attached = shared # keep the mapping alive with the table
+        NeighborTable.cache[radius] = table
+        return table
+
+if __name__ == "__main__":
+
+    from multiprocessing import (Pool)
+    from timeit import (default_timer)
+
+    def degrees(args):
+        """Worker: attach to a shared table and sum its degrees."""
+        name, radius = args
+        table = NeighborTable.attach(name, radius)
+        return sum(table.degree(t) for t in range(1, table.tiles+1))
+
+    table = NeighborTable.of(2)
+    assert NeighborTable.of(2) is table
+    assert list(table.row(1)) == [3, 4, 5, 6, 7, 2]
+    assert table.adjacent(1, 2) and not table.adjacent(1, 8)
+    assert (len(table.indptr), len(table.indices)) == NeighborTable.sizes(2)
+    pairs = table.adjacents([1, 2, 8, 19], [2, 9, 1, 8])
+    assert list(pairs) == [True, True, False, True]
+
+    name = table.share()
+    pool = Pool(2)
+    assert pool.map(degrees, [(name, 2)] * 2) == [len(table.indices)] * 2
+    pool.close()
+    pool.join()
+    table.unshare()
+    print 'shared CSR table verified for radius', table.radius
+
+    t0 = default_timer()
+    table = NeighborTable.of(577)
+    t1 = default_timer()
+    print '%d tiles: CSR table of %d bytes in %.1f ms' % (
+            table.tiles, table.nbytes, 1e3*(t1-t0))
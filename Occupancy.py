@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+"""
+Occupancy.py
+
+A packed bitmap of the tiles of a mesh that hold a strand.
+
+Bit t (most significant bit first within each byte) is set
+when tile t is occupied; bit 0 is unused, as slot 0 is in TileStore.
+A mesh of 10^6 tiles needs 125 kB of occupancy
+where the strand column needs 4 MB.
+
+Tests and updates are vectorized over arrays of tile numbers:
+    occupancy = Occupancy.of(store.strand)
+    occupancy[tiles]                # bool array
+    occupancy.permute(move, tiles)  # carry the bits of tiles along move
+permute with tiles given touches only those tiles (and their destinations),
+so displacing a few chains on a large sparse mesh costs only their length.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from numpy import (asarray, zeros, packbits, unpackbits, uint8, int64)
+
+class Occupancy(object):
+    """
+    Occupancy is a packed bitmap over tiles 0..tiles.
+    """
+
+    def __init__(self, tiles):
+        self.tiles = tiles
+        self.bits = zeros((tiles + 8) // 8, dtype=uint8)
+
+    @staticmethod
+    def of(strand):
+        """Occupancy of a strand column (nonzero strand: occupied)."""
+        strand = asarray(strand)
+        occupancy = Occupancy(len(strand) - 1)
+        occupancy.bits[:] = packbits(strand != 0)
+        return occupancy
+
+    def __len__(self):
+        return self.tiles
+
+    def __getitem__(self, tiles):
+        """Whether tiles (scalar or array) are occupied."""
+        tiles = asarray(tiles, dtype=int64)
+        return ((self.bits[tiles >> 3] >> (7 - (tiles & 7))) & 1).astype(bool)
+
+    def __setitem__(self, tiles, values):
+        """Occupy (True) or vacate (False) tiles; tiles must be distinct."""
+        tiles = asarray(tiles, dtype=int64)
+        mask = (1 << (7 - (tiles & 7))).astype(uint8)
+        byte = tiles >> 3
+        values = asarray(values, dtype=bool) + zeros(tiles.shape, dtype=bool)
+        # Several tiles may share a byte, so clear and set bit by bit.
+        for n in range(8):
+            some = (tiles & 7) == n
+            self.bits[byte[some]] &= ~mask[some]
+            self.bits[byte[some & values]] |= mask[some & values]
+
+    def permute(self, move, tiles=None):
+        """
+        Carry occupancy along a move array (see Permutation.py).
+        tiles, when given, lists every tile that move does not fix.
+        """
+        move = asarray(move)
+        if tiles is None:
+            flags = unpackbits(self.bits)[:self.tiles+1]
+            moved = zeros(len(flags), dtype=uint8)
+            moved[move] = flags
+            self.bits[:] = packbits(moved)
+        else:
+            tiles = asarray(tiles, dtype=int64)
+            self[move[tiles]] = self[tiles]
+        return self
+
+    def count(self):
+        """Count of occupied tiles."""
+        return int(unpackbits(self.bits)[:self.tiles+1].sum())
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+if __name__ == "__main__":
+
+    from timeit import (default_timer)
+    from numpy import (arange, where, int32)
+
+    strand = zeros(12, dtype=int32)
+    strand[[1, 2, 3, 9]] = [1, 2, 3, 4]
+    occupancy = Occupancy.of(strand)
+    assert list(occupancy[arange(12)]) == list(strand != 0)
+    move = arange(12)
+    move[[3, 4]] = [4, 3]
+    occupancy.permute(move, [3, 4])
+    assert occupancy[4] and not occupancy[3] and occupancy.count() == 4
+    occupancy.permute(move)
+    assert occupancy[3] and not occupancy[4]
+
+    tiles = 10 ** 6
+    strand = where(arange(tiles+1) % 100 == 1, 1, 0)
+    t0 = default_timer()
+    occupancy = Occupancy.of(strand)
+    t1 = default_timer()
+    occupied = occupancy[arange(1, tiles+1)]
+    t2 = default_timer()
+    assert occupied.sum() == occupancy.count() == 10 ** 4
+    print '%d tiles in %d bytes: built in %.1f ms, all tested in %.1f ms' % (
+            tiles, occupancy.nbytes, 1e3*(t1-t0), 1e3*(t2-t1))
+
+    # Translate every strand on the edge of a sparse bundle one step out.
+    from HexTile import (HexTile)
+    from Spiral import (fullRing)
+    Tiles, tubulin = fullRing(300), fullRing(30)
+    kw = {'--Rings': '0', '--Tiles': str(Tiles), '--tubulin': str(tubulin),
+          '--rotate': False, '--label': False}
+    h = HexTile(**kw)
+    strands = arange(1, tubulin+1)
+    outward = h.neighbors_of(strands)[:, 0]
+    edge = ~h.store.occupancy[outward]
+    flat = zeros(2 * edge.sum(), dtype=int32)
+    flat[0::2], flat[1::2] = strands[edge], outward[edge]
+    offsets = arange(0, len(flat)+1, 2, dtype=int32)
+    t0 = default_timer()
+    h.translate((flat, offsets), [[1, 2, 3]])
+    t1 = default_timer()
+    assert h.store.occupancy.count() == tubulin
+    assert (h.store.strand[outward[edge]] == strands[edge]).all()
+    assert h[-1] == 2 and not h.store.occupancy[strands[edge]].any()
+    print '%d chains translated with a rotation on %d tiles in %.1f ms' % (
+            edge.sum(), Tiles, 1e3*(t1-t0))
+    try:
+        h.translate([[4, 5]])
+    except AssertionError as error:
+        print error
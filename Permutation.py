@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+"""
+Permutation.py
+
+A layer transform of a HexTile mesh as one int32 tile permutation.
+
+move[t] is the tile to which the occupant of tile t moves;
+move[0] is 0 so that tile numbers index move directly.
+Rotation groups compile into a permutation with every tile of a group
+sent to the next tile of the same group and all other tiles fixed.
+
+Permutations compose, invert and apply to a TileStore with one gather
+(strand -> tile inverse) and one scatter (tile -> strand column):
+    p = Permutation.ofGroups(flat, offsets, tiles)
+    q = Permutation.ofGroups(flat2, offsets2, tiles)
+    (q * p)         # p then q
+    p.inverse()     # undoes p
+    p.applyTo(store)
+Compiled group permutations are cached, so a layer schedule that
+recurs costs one dictionary lookup after its first use;
+the cache is cleared when it reaches limit entries or budget bytes.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from numpy import (asarray, arange, empty, array_equal, int32)
+
+from Groups import (successors)
+
+class Permutation(object):
+    """
+    Permutation wraps the int32 move array of one layer transform.
+    """
+
+    cache = {} # (tiles, flat bytes, offsets bytes): Permutation
+    limit = 1024 # cache entries kept before the cache is cleared
+    budget = 64 << 20 # cache bytes kept before the cache is cleared
+    size = 0 # cache bytes held
+
+    def __init__(self, move):
+        self.move = asarray(move, dtype=int32)
+        self.move.flags.writeable = False
+
+    @staticmethod
+    def identity(tiles):
+        return Permutation(arange(tiles+1, dtype=int32))
+
+    @staticmethod
+    def ofGroups(flat, offsets, tiles, reverse=False, cache=True):
+        """
+        Compile rotation groups (see Groups.py) into one permutation.
+        reverse rotates every group the other way.
+        cache=False skips the cache for layouts that will not recur.
+        """
+        flat = asarray(flat, dtype=int32)
+        offsets = asarray(offsets, dtype=int32)
+        key = (tiles, reverse, flat.tobytes(), offsets.tobytes())
+        permutation = Permutation.cache.get(key, None) if cache else None
+        if permutation is None:
+            move = arange(tiles+1, dtype=int32)
+            if reverse:
+                move[flat[successors(offsets)]] = flat
+            else:
+                move[flat] = flat[successors(offsets)]
+            permutation = Permutation(move)
+            entry = move.nbytes + len(key[2]) + len(key[3])
+            if cache and entry <= Permutation.budget:
+                if len(Permutation.cache) >= Permutation.limit or \
+                        Permutation.size + entry > Permutation.budget:
+                    Permutation.cache.clear()
+                    Permutation.size = 0
+                Permutation.cache[key] = permutation
+                Permutation.size += entry
+        return permutation
+
+    def __len__(self):
+        """Count of tiles permuted (slot 0 excluded)."""
+        return len(self.move) - 1
+
+    def __eq__(self, other):
+        return array_equal(self.move, other.move)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __mul__(self, other):
+        """self * other applies other first, then self."""
+        return Permutation(self.move.take(other.move))
+
+    def __pow__(self, n):
+        """Repeated application; negative n repeats the inverse."""
+        base = self if n >= 0 else self.inverse()
+        result, n = Permutation.identity(len(self)), abs(n)
+        while n:
+            if n & 1:
+                result = base * result
+            base, n = base * base, n >> 1
+        return result
+
+    def __call__(self, tiles):
+        """Destination of the occupants of tiles (scalar or array)."""
+        return self.move[tiles]
+
+    def inverse(self):
+        inverse = empty(len(self.move), dtype=int32)
+        inverse[self.move] = arange(len(self.move), dtype=int32)
+        return Permutation(inverse)
+
+    def applyTo(self, store):
+        """
+        Move every occupant of a TileStore in place.
+        The strand-to-tile inverse is gathered through move and
+        the strand column and occupancy bitmap are scattered
+        to the destination tiles.
+        A SparseStore, which holds no columns, moves its own records.
+        """
+        if hasattr(store, 'permute'):
+            return store.permute(self.move)
+        store.tile[:] = self.move.take(store.tile)
+        store.strand[self.move] = store.strand.copy()
+        store.occupancy.permute(self.move)
+        return store
+
+if __name__ == "__main__":
+
+    from timeit import (default_timer)
+    from Groups import (flatten)
+    from Spiral import (fullRing, ringTiles)
+    from TileStore import (TileStore)
+
+    p = Permutation.ofGroups(*flatten([[1, 2, 3]]), tiles=7)
+    assert list(p.move) == [0, 2, 3, 1, 4, 5, 6, 7]
+    assert Permutation.ofGroups(*flatten([[1, 2, 3]]), tiles=7) is p
+    assert p * p.inverse() == Permutation.identity(7)
+    assert p ** 3 == Permutation.identity(7) and p ** -1 == p.inverse()
+    store = TileStore(7)
+    store.strand[:] = arange(8)
+    p.applyTo(store)
+    # Tile 1 now has tubulin 3, Tile 2 tubulin 1, and Tile 3 tubulin 2.
+    assert list(store.strand[1:4]) == [3, 1, 2] and store[-1] == 2
+
+    radius = 182
+    tiles = fullRing(radius)
+    store = TileStore(tiles)
+    store.strand[:] = arange(tiles+1)
+    flat, offsets = flatten([ringTiles(ring) for ring in range(1, radius+1)])
+    t0 = default_timer()
+    p = Permutation.ofGroups(flat, offsets, tiles)
+    t1 = default_timer()
+    p.applyTo(store)
+    t2 = default_timer()
+    assert (store.strand[store.tile[1:]] == arange(1, tiles+1)).all()
+    print '%d tiles: compiled in %.1f ms, applied in %.1f us per 1000 tiles' % (
+            tiles, 1e3*(t1-t0), 1e6*(t2-t1)*1000/tiles)
+
+    # Displacing never caches; many distinct layouts stay within budget.
+    entries = len(Permutation.cache)
+    for ring in range(1, 101):
+        store.displace(*flatten([ringTiles(ring)]))
+    assert len(Permutation.cache) == entries
+    for ring in range(1, 101):
+        Permutation.ofGroups(*flatten([ringTiles(ring)]), tiles=tiles)
+    assert Permutation.size <= Permutation.budget
+    assert Permutation.size == sum(p.move.nbytes + len(key[2]) + len(key[3])
+            for key, p in Permutation.cache.items())
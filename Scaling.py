@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""
+Scaling.py
+
+Scaling benchmark of the HexTile pipeline from tens to millions of tiles.
+
+For each radius a fresh process builds a full mesh, generates one layer of
+random rotation groups (Cycles.py), validates them (Groups.py),
+rotates them and renders the mesh as text.
+Each stage is timed, and the peak resident memory of the process
+above its baseline after imports is reported,
+both in total and per tile, so that linear growth shows as flat columns.
+
+    python Scaling.py                # radii 10, 30, 100, 300, 577
+    python Scaling.py 50 200         # chosen radii
+Radius 577 is the first mesh of over 10^6 tiles.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from sys import (argv)
+from resource import (getrusage, RUSAGE_SELF)
+from multiprocessing import (Pool)
+from timeit import (default_timer)
+
+from Spiral import (fullRing)
+
+stages = ('build', 'cycles', 'check', 'rotate', 'render')
+
+def peak():
+    """Peak resident memory of this process in bytes (Linux reports kB)."""
+    return getrusage(RUSAGE_SELF).ru_maxrss * 1024
+
+def measure(radius):
+    """
+    Worker: run every stage once for a mesh of the given radius.
+    Returns (tiles, seconds per stage, peak bytes above baseline).
+    """
+    from HexTile import (HexTile)
+    from Cycles import (Cycles)
+    tiles = fullRing(radius)
+    kw = {'--Rings': '0', '--Tiles': str(tiles), '--tubulin': str(tiles),
+          '--rotate': False, '--label': False}
+    base = peak()
+    times = [default_timer()]
+    h = HexTile(**kw)
+    times += [default_timer()]
+    groups = Cycles(radius, seed=1).random()
+    times += [default_timer()]
+    assert h.check(groups)
+    times += [default_timer()]
+    h.kw['--rotate'] = True
+    h.rotate(groups)
+    times += [default_timer()]
+    assert str(h)
+    times += [default_timer()]
+    seconds = [b - a for a, b in zip(times[:-1], times[1:])]
+    return tiles, seconds, peak() - base
+
+if __name__ == "__main__":
+
+    radii = [int(arg) for arg in argv[1:]] or [10, 30, 100, 300, 577]
+    print '%9s %s %9s %9s' % ('tiles', ' '.join('%9s' % s for s in stages),
+            'MB', 'B/tile')
+    print '%9s %s %9s' % ('', ' '.join('%9s' % 'us/tile' for s in stages), '')
+    # One process per mesh, so each peak memory reading is its own.
+    pool = Pool(1, maxtasksperchild=1)
+    for tiles, seconds, memory in pool.imap(measure, radii):
+        print '%9d %s %9.1f %9.0f' % (tiles,
+                ' '.join('%9.2f' % (1e6*s/tiles) for s in seconds),
+                memory/1e6, float(memory)/tiles)
+    pool.close()
+    pool.join()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+"""
+Scanline.py
+
+Streaming text rendering of a HexTile, one scan line at a time.
+
+The text rendering of HexTile.__str__ stamps every tile into a canvas
+of width x height characters and then cleans the whole canvas.
+Here the same lines are produced top to bottom by a generator
+holding only the current and previous line:
+    for line in scanlines(h):
+        sink.write(line)
+A tile's template covers five lines at a pitch of 2 lines per unit of
+B-G, so the tiles touching line y are found from the geometry alone:
+those with 2(B-G) in [y0+2-y, y0+6-y], for every R of matching parity.
+Within a line, tiles are stamped in tile order with their labels,
+exactly as the canvas renderer stamps them,
+and the "horns" are removed by comparison with the line above,
+which is final by then.
+Memory is O(width), so a mesh of any size renders to a file or socket.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from numpy import (arange, concatenate, frombuffer, full, zeros, uint8, int64)
+
+from Spiral import (rgbsTile, tilesRing)
+
+S, V, U, BS, FS = (ord(c) for c in ' |_\\/')
+
+def touching(hextile, y, y0):
+    """
+    Tiles whose template covers line y (center line y0), in tile order.
+    Returns tiles, their R coordinates and the template line drawn on y.
+    """
+    radius, tubes = hextile.radius, hextile.tubes
+    top = -((-(y0 + 2 - y)) // 2)
+    parts = []
+    for d in range(top, (y0 + 6 - y) // 2 + 1):
+        R = arange(-radius, radius + 1, dtype=int64)
+        R = R[(R + d) % 2 == 0]
+        G, B = -(R + d) // 2, (d - R) // 2
+        keep = (abs(G) <= radius) & (abs(B) <= radius)
+        R, G, B = R[keep], G[keep], B[keep]
+        tiles = rgbsTile(R, G, B)
+        keep = tiles <= tubes
+        parts += [(tiles[keep], R[keep], zeros(keep.sum(), int64) +
+                   y - (y0 - 2 * d + 2))]
+    if not parts:
+        return (zeros(0, int64),) * 3
+    tiles, R, line = (concatenate(part) for part in zip(*parts))
+    order = tiles.argsort()
+    return tiles[order], R[order], line[order]
+
+def labels(hextile, tiles, line):
+    """Text written on its template line by each tile (or '')."""
+    store = hextile.store
+    strand = store.values('strand', tiles)
+    if hextile.kw['--label']:
+        ring = tilesRing(tiles)
+        texts = []
+        for n, tile in enumerate(tiles.tolist()):
+            if line[n] == 1:
+                texts += ['T%d' % tile]
+            elif line[n] == 2:
+                texts += ['S%d' % strand[n] if strand[n] else '']
+            elif line[n] == 3:
+                texts += ['R%d' % ring[n]]
+            else:
+                texts += ['']
+        return texts
+    group = store.values('group', tiles)
+    moved = store.values('moved', tiles)
+    return ['%s%d' % (hextile.letters(group[n]), moved[n] + 1)
+            if line[n] == 2 and strand[n] and strand[n] != tiles[n] else ''
+            for n in range(len(tiles))]
+
+def scanlines(hextile):
+    """Generate the lines of str(hextile), each ending in a newline."""
+    W, H = hextile.canvas()
+    x0, y0 = W / 2, H / 2
+    template = [frombuffer(line, dtype=uint8) for line in hextile.template]
+    width = len(template[0])
+
+    yield ' ' + '_' * (W - 3) + ' \n'
+    above = None
+    for y in range(H):
+        row = full(W, S, dtype=uint8)
+        tiles, R, line = touching(hextile, y, y0)
+        texts = labels(hextile, tiles, line)
+        for x, n, text in zip((x0 + 7 * R - 4).tolist(), line.tolist(), texts):
+            row[x:x+width] = template[n]
+            if text:
+                row[x+2:x+2+len(text)] = frombuffer(text, dtype=uint8)
+        # Get rid of "horns" atop the hexagons
+        if above is not None:
+            c, cup = row[1:W-2], above[1:W-2]
+            horn = ((c == BS) & (above[0:W-3] == S) & (cup != FS)) | (
+                    (c == FS) & (above[2:W-1] == S) & (cup != BS))
+            c[horn] = S
+        above = row
+        text = row[2:-1].tobytes()
+        if text.strip():
+            yield '|' + text + '|\n'
+    yield '|' + '_' * (W - 3) + '|\n'
+
+    # Announce how many tubulin fibers there are in how many rings
+    if hextile.verbose:
+        if hextile.kw['--rotate']:
+            yield 'Letters/Numbers are rotation groups/elements\n'
+        else:
+            yield 'T(tile#), strand(protein#), H(ring#)\n'
+            yield 'tubulin(%d), rings(%d)\n' % (hextile.tubes, hextile.radius+1)
+
+if __name__ == "__main__":
+
+    from timeit import (default_timer)
+    from cStringIO import (StringIO)
+    from resource import (getrusage, RUSAGE_SELF)
+    from HexTile import (HexTile)
+    from Spiral import (fullRing)
+
+    # The streamed lines are exactly those of the canvas renderer.
+    cases = [
+        {'--Tiles': '1', '--tubulin': '1', '--label': True},
+        {'--Tiles': '37', '--tubulin': '37', '--label': True, '--rotate': True,
+         'rotates': [range(20, 38), [6, 7, 18, 17, 16], [4, 5, 14], [1, 2, 3]]},
+        {'--Tiles': '91', '--tubulin': '61', '--rotate': True,
+         'rotates': [range(38, 62), range(20, 38), [1, 2, 3]]},
+        {'--Tiles': str(fullRing(30)), '--tubulin': '2000', '--label': True},
+        ]
+    for kw in cases:
+        kw.update({'--Rings': '0'})
+        kw.setdefault('--rotate', False)
+        kw.setdefault('--label', False)
+        h = HexTile(**kw)
+        assert h.render(StringIO()).getvalue() == str(h), kw['--Tiles']
+    print 'streamed renderings match str() for', [kw['--Tiles'] for kw in cases]
+
+    class Count(object):
+        """A sink that only counts what it is sent."""
+        size = 0
+        def write(self, text):
+            self.size += len(text)
+
+    for radius in [30, 182]:
+        tiles = fullRing(radius)
+        kw = {'--Rings': '0', '--Tiles': str(tiles), '--tubulin': str(tiles),
+              '--rotate': False, '--label': True}
+        h = HexTile(**kw)
+        before = getrusage(RUSAGE_SELF).ru_maxrss
+        t0 = default_timer()
+        sink = h.render(Count())
+        t1 = default_timer()
+        print '%6d tiles: %9d characters streamed in %.2f s, %d kB peak growth' % (
+                tiles, sink.size, t1-t0, getrusage(RUSAGE_SELF).ru_maxrss - before)
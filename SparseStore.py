@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+
+"""
+SparseStore.py
+
+Storage for a large, lightly occupied HexTile mesh.
+
+Where TileStore (TileStore.py) holds one int32 per field per tile,
+SparseStore holds records only for the occupied tiles:
+    held    sorted int64 tile numbers of the occupied tiles
+            (a spiral tile number is a packed RGB coordinate, see Spiral.py);
+    strand, group, moved
+            int32 values parallel to held;
+    tile    the strand-to-tile inverse, one entry per strand.
+A tile is found by binary search in held.
+Geometry (R, G, B, ring) is never stored: it is computed on demand,
+for empty and occupied tiles alike, from the closed-form spiral.
+A mesh of 10^7 tiles holding 10^4 strands takes about 240 kB.
+
+SparseStore offers the part of the TileStore interface that HexTile relies upon:
+columns indexable by tile number (store.R[tiles], store.strand[tiles]),
+store[n] and store[-n], spatial queries, adjacency (as table),
+occupancy, occupied(), displace(flat, offsets) and permute(move).
+Its columns are not arrays: they are read and written at given tiles
+but cannot be sliced, copied or scanned whole;
+occupied() lists the tiles holding a strand for either store.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from numpy import (asarray, arange, argsort, zeros, where, minimum, maximum)
+from numpy import (int32, int64)
+
+from Spiral import (fullRing, radiusFor, tilesRGB, tilesRing, rgbsTile, neighbor)
+from Groups import (successors, members)
+from TileStore import (TileView)
+
+_neighbor = asarray(neighbor, dtype=int64)
+
+class Derived(object):
+    """
+    Derived is a read-only geometry column computed from tile numbers.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __getitem__(self, tiles):
+        tiles = asarray(tiles, dtype=int64)
+        flat = tiles.ravel()
+        if self.name == 'ring':
+            values = tilesRing(flat)
+        else:
+            values = tilesRGB(flat)['RGB'.index(self.name)]
+        values = values.reshape(tiles.shape)
+        return values if values.ndim else values[()]
+
+class Held(object):
+    """
+    Held is a column with values for occupied tiles and 0 elsewhere.
+    """
+
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+
+    def __getitem__(self, tiles):
+        slot, found = self.store.slots(tiles)
+        values = where(found, getattr(self.store, '_' + self.name)[slot], 0)
+        return values if values.ndim else values[()]
+
+    def __setitem__(self, tiles, values):
+        slot, found = self.store.slots(tiles)
+        assert found.all(), 'sparse columns are written at occupied tiles'
+        getattr(self.store, '_' + self.name)[slot] = values
+
+class Occupied(object):
+    """
+    Occupied answers occupancy tests (see Occupancy.py) from held.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return self.store.tiles
+
+    def __getitem__(self, tiles):
+        return self.store.slots(tiles)[1]
+
+    def count(self):
+        return len(self.store.held)
+
+    nbytes = 0
+
+class SparseStore(object):
+    """
+    SparseStore holds records for the occupied tiles of one mesh.
+    """
+
+    fields = ('R', 'G', 'B', 'ring', 'strand', 'group', 'moved')
+    geometry = ('R', 'G', 'B', 'ring')
+    shared = True # Geometry is closed form, never built.
+    touched = None # called with the tiles written through a TileView
+
+    def __init__(self, tiles, held=[]):
+        """
+        A mesh of tiles 1..tiles with strands 1..n placed,
+        in order, on the n distinct tiles listed in held.
+        """
+        self.tiles = tiles
+        self.radius = radiusFor(tiles)
+        self.place(held)
+        for field in SparseStore.geometry:
+            setattr(self, field, Derived(field))
+        for field in ('strand', 'group', 'moved'):
+            setattr(self, field, Held(self, field))
+        self.occupancy = Occupied(self)
+        self.table = self
+
+    def place(self, held):
+        """Place strands 1..n, in order, on the n distinct tiles of held."""
+        held = asarray(held, dtype=int64)
+        assert ((1 <= held) & (held <= self.tiles)).all()
+        self.strands = len(held)
+        self.held = held
+        self._strand = arange(1, len(held)+1, dtype=int32)
+        self._group = zeros(len(held), dtype=int32)
+        self._moved = zeros(len(held), dtype=int32)
+        self.tile = zeros(len(held)+1, dtype=int32)
+        return self.sort()
+
+    def sort(self):
+        """Restore the order of held (and its parallel columns) after a move."""
+        order = argsort(self.held, kind='mergesort')
+        for name in ('held', '_strand', '_group', '_moved'):
+            setattr(self, name, getattr(self, name)[order])
+        self.tile[self._strand] = self.held
+        return self
+
+    def slots(self, tiles):
+        """Position in held of tiles (any shape), and whether occupied."""
+        tiles = asarray(tiles, dtype=int64)
+        if not len(self.held):
+            return zeros(tiles.shape, dtype=int64), zeros(tiles.shape, bool)
+        slot = minimum(self.held.searchsorted(tiles), len(self.held)-1)
+        return slot, self.held[slot] == tiles
+
+    def occupy(self):
+        """Occupancy always reflects held."""
+        return self.occupancy
+
+    def occupied(self):
+        """Sorted tile numbers holding a strand (a copy of held)."""
+        return self.held.copy()
+
+    def __len__(self):
+        return self.tiles
+
+    def __contains__(self, n):
+        return n != 0 and (n <= self.tiles if n > 0 else -n < len(self.tile))
+
+    def __getitem__(self, n):
+        """
+        Positive numbers are cardinal tile numbers and return a TileView.
+        Negative numbers are tubulin fiber numbers and return a tile number.
+        """
+        if not n in self:
+            raise KeyError(n)
+        if n < 0:
+            return int(self.tile[-n])
+        return TileView(self, n)
+
+    def ringTiles(self, ring):
+        """Occupied tiles of a ring, a slice of held."""
+        first = fullRing(ring-1) + 1 if ring else 1
+        start, stop = self.held.searchsorted([first, fullRing(ring) + 1])
+        return self.held[start:stop]
+
+    def value(self, key, n):
+        """One field of one tile (see TileStore.value)."""
+        return int(getattr(self, key)[n])
+
+    def values(self, key, tiles):
+        """Batched value over an array of tiles."""
+        return getattr(self, key)[tiles]
+
+    def tiles_at(self, R, G, B):
+        """Tile numbers at RGB coordinates, 0 where off the mesh."""
+        R, G, B = (asarray(v, dtype=int64) for v in (R, G, B))
+        ring = maximum(maximum(abs(R), abs(G)), abs(B))
+        inside = (R + G + B == 0) & (ring <= self.radius)
+        tiles = where(inside, rgbsTile(R * inside, G * inside, B * inside), 0)
+        tiles[tiles > self.tiles] = 0
+        return tiles.astype(int32)
+
+    def tile_at(self, R, G, B):
+        return int(self.tiles_at([R], [G], [B])[0])
+
+    def neighbors_of(self, tiles):
+        """Batched neighbors: (n, 6) int32 array, 0 for absent neighbors."""
+        R, G, B = tilesRGB(asarray(tiles, dtype=int64).ravel())
+        return self.tiles_at(R[:, None] + _neighbor[:, 0],
+                G[:, None] + _neighbor[:, 1], B[:, None] + _neighbor[:, 2])
+
+    def neighbors(self, tile):
+        return [n for n in self.neighbors_of([tile])[0] if n]
+
+    def adjacents(self, t1, t2):
+        """Vectorized edge-adjacency of tiles on this mesh."""
+        t1, t2 = asarray(t1, dtype=int64), asarray(t2, dtype=int64)
+        a, b = tilesRGB(t1.ravel()), tilesRGB(t2.ravel())
+        step = maximum(maximum(abs(a[0] - b[0]), abs(a[1] - b[1])),
+                abs(a[2] - b[2]))
+        inside = (1 <= t1.ravel()) & (t1.ravel() <= self.tiles) & (
+                (1 <= t2.ravel()) & (t2.ravel() <= self.tiles))
+        return ((step == 1) & inside).reshape(t1.shape)
+
+    def adjacent(self, t1, t2):
+        return bool(self.adjacents([t1], [t2])[0])
+
+    def displace(self, flat, offsets):
+        """
+        Move the occupants of groups (cycles and chains alike,
+        see Groups.py) one step; only occupied tiles are touched.
+        """
+        flat = asarray(flat, dtype=int64)
+        follow = flat[successors(offsets)]
+        group, moved = members(offsets)
+        slot, found = self.slots(flat)
+        slot = slot[found]
+        self.held[slot] = follow[found]
+        self._group[slot] = group[found]
+        self._moved[slot] = moved[found]
+        return self.sort()
+
+    def permute(self, move):
+        """
+        Move the occupant of every tile t to move[t]
+        (see Permutation.applyTo).
+        """
+        self.held = asarray(move, dtype=int64)[self.held]
+        return self.sort()
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in
+                ('held', '_strand', '_group', '_moved', 'tile'))
+
+if __name__ == "__main__":
+
+    from timeit import (default_timer)
+    from TileStore import (TileStore)
+    from Groups import (flatten)
+    from HexTile import (HexTile)
+    from Axon import (LayerStack)
+    from Permutation import (Permutation)
+
+    # A sparse store agrees with a dense one on every query.
+    dense, sparse = TileStore(61), SparseStore(61, arange(1, 20))
+    dense.R[1:], dense.G[1:], dense.B[1:] = tilesRGB(arange(1, 62))
+    dense.ring[1:] = tilesRing(arange(1, 62))
+    dense.strand[1:20] = arange(1, 20)
+    dense.occupy()
+    tiles = arange(1, 62)
+    for field in SparseStore.fields:
+        assert (getattr(dense, field)[tiles] == getattr(sparse, field)[tiles]).all()
+    assert (dense.neighbors_of(tiles) == sparse.neighbors_of(tiles)).all()
+    assert dense[5] == sparse[5] and sparse[-7] == 7
+    groups = flatten([[1, 2, 3], [8, 20, 21], [4, 14, 13, 12]])
+    assert (dense.table.adjacents(tiles, tiles % 61 + 1) ==
+            sparse.adjacents(tiles, tiles % 61 + 1)).all()
+    dense.displace(*groups)
+    sparse.displace(*groups)
+    for field in ('strand', 'group', 'moved'):
+        column = getattr(dense, field)[tiles]
+        assert (column[dense.strand[tiles] != 0] ==
+                getattr(sparse, field)[sparse.held]).all()
+    assert (dense.tile[1:20] == sparse.tile[1:]).all()
+
+    # A permutation moves sparse and dense occupants alike.
+    move = Permutation.ofGroups(*flatten([[2, 9, 22, 10], [30, 31]]), tiles=61)
+    move.applyTo(dense)
+    move.applyTo(sparse)
+    assert (dense.strand[tiles] == sparse.strand[tiles]).all()
+    assert (dense.tile[1:20] == sparse.tile[1:]).all()
+    assert (dense.occupied() == sparse.occupied()).all()
+
+    # Layers of a sparse HexTile materialize as sparse views.
+    kw = {'--Rings': '0', '--Tiles': '61', '--tubulin': '19',
+          '--rotate': False, '--label': False}
+    views = []
+    for option in [False, True]:
+        kw['--sparse'] = option
+        stack = LayerStack(HexTile(**kw)).appendGroups([[1, 2, 3], [8, 20, 21]])
+        views += [stack.appendGroups([[2, 9, 22, 10]]).hextile(2)]
+    assert views[1].sparse and hasattr(views[1].store, 'held')
+    assert (views[0].store.strand[tiles] == views[1].store.strand[tiles]).all()
+    assert [views[0][-s] for s in range(1, 20)] == [views[1][-s] for s in range(1, 20)]
+
+    radius = 1826
+    tiles, strands = fullRing(radius), 10 ** 4
+    t0 = default_timer()
+    store = SparseStore(tiles, arange(1, strands+1))
+    t1 = default_timer()
+    rim = arange(fullRing(radius-1)+1, tiles+1)
+    R, G, B = store.R[rim], store.G[rim], store.B[rim]
+    t2 = default_timer()
+    assert (store.tiles_at(R, G, B) == rim).all()
+    print '%d tiles, %d strands: %d bytes, built in %.1f ms' % (
+            tiles, strands, store.nbytes, 1e3*(t1-t0))
+    print 'geometry of %d empty rim tiles on demand in %.1f ms' % (
+            len(rim), 1e3*(t2-t1))
+
+    # A sparse HexTile: strands cross a large empty mesh by translation.
+    kw = {'--Rings': '0', '--Tiles': str(tiles), '--tubulin': str(strands),
+          '--rotate': False, '--label': False, '--sparse': True}
+    t0 = default_timer()
+    h = HexTile(**kw)
+    t1 = default_timer()
+    held = h.store.held.copy()
+    outward = h.neighbors_of(held)[:, 0]
+    edge = ~h.store.occupancy[outward]
+    flat = zeros(2 * edge.sum(), dtype=int32)
+    flat[0::2], flat[1::2] = held[edge], outward[edge]
+    h.translate((flat, arange(0, len(flat)+1, 2, dtype=int32)))
+    t2 = default_timer()
+    assert h.store.occupancy.count() == strands
+    assert (h.store.strand[outward[edge]] == held[edge]).all()
+    print 'sparse HexTile of %d tiles in %.1f ms, %d chains translated in %.1f ms' % (
+            len(h), 1e3*(t1-t0), edge.sum(), 1e3*(t2-t1))
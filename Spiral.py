@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+"""
+Spiral.py
+
+Closed-form conversion between spiral tile numbers, ring numbers,
+and RGB (cube) coordinates of a hexagonal mesh.
+
+Tiles are numbered along a stepped spiral exactly as HexTile.generateRings
+lays them out: tile 1 is the center (ring 0); ring k holds 6k tiles
+numbered from 3k(k-1)+2 through 3k(k+1)+1, beginning with the first tile
+after 12 noon and proceeding clockwise along six sides of k tiles each.
+
+Every scalar function is O(1).
+The plural forms (tilesRing, tilesRGB, rgbsTile) take whole numpy arrays
+so that the geometry of a mesh of any size is built without Python loops.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from math import (sqrt)
+from numpy import (array, asarray, arange, ceil, maximum, select, where)
+from numpy import (int32, int64)
+import numpy
+
+# Step taken along each of the six sides of a ring (same as HexTile.neighbor).
+neighbor = [[1,0,-1],[0,1,-1],[-1,1,0],[-1,0,1],[0,-1,1],[1,-1,0]]
+# Unit-ring corner from which each side departs.
+corner = [[0,-1,1],[1,-1,0],[1,0,-1],[0,1,-1],[-1,1,0],[-1,0,1]]
+
+_neighbor = array(neighbor, dtype=int64)
+_corner = array(corner, dtype=int64)
+
+def fullRing(radius):
+    """Count of tiles in a mesh of the given radius (rings 0..radius)."""
+    return 1 + 3 * radius * (radius + 1)
+
+def radiusFor(area):
+    """Smallest radius whose full mesh holds at least area tiles."""
+    assert area > 0
+    return tileRing(area)
+
+def ringTiles(ring):
+    """Tile numbers in a ring, in spiral order."""
+    if ring == 0:
+        return arange(1, 2, dtype=int32)
+    return arange(fullRing(ring-1)+1, fullRing(ring)+1, dtype=int32)
+
+def tileRing(tile):
+    """Ring number of a tile."""
+    i = tile - 1
+    k = int(ceil((sqrt(9 + 12 * i) - 3) / 6.0))
+    # Guard against floating point error near ring boundaries.
+    while 3 * k * (k + 1) < i:
+        k += 1
+    while k > 0 and 3 * k * (k - 1) >= i:
+        k -= 1
+    return k
+
+def tileRGB(tile):
+    """RGB coordinates of a tile."""
+    k = tileRing(tile)
+    if k == 0:
+        return (0, 0, 0)
+    j, m = divmod(tile - fullRing(k-1) - 1, k)
+    return tuple(k * c + (m + 1) * d for c, d in zip(corner[j], neighbor[j]))
+
+def rgbRing(R, G, B):
+    """Ring number of an RGB coordinate."""
+    return max(abs(R), abs(G), abs(B))
+
+def rgbTile(R, G, B):
+    """Tile number of an RGB coordinate."""
+    assert R + G + B == 0
+    k = rgbRing(R, G, B)
+    if k == 0:
+        return 1
+    if G == -k and 1 <= R:
+        j, m = 0, R
+    elif R == k and G <= 0:
+        j, m = 1, G + k
+    elif B == -k and 1 <= G:
+        j, m = 2, G
+    elif G == k and R <= -1:
+        j, m = 3, -R
+    elif R == -k and G <= k - 1:
+        j, m = 4, k - G
+    else:
+        j, m = 5, R + k
+    return fullRing(k-1) + j * k + m
+
+def tilesRing(tiles):
+    """Vectorized tileRing over an array of tile numbers."""
+    i = asarray(tiles, dtype=int64) - 1
+    k = ceil((numpy.sqrt(9 + 12 * i) - 3) / 6.0).astype(int64)
+    k += (3 * k * (k + 1) < i)
+    k -= (k > 0) & (3 * k * (k - 1) >= i)
+    return k.astype(int32)
+
+def tilesRGB(tiles):
+    """Vectorized tileRGB; returns three int32 arrays R, G, B."""
+    tiles = asarray(tiles, dtype=int64)
+    k = tilesRing(tiles).astype(int64)
+    p = tiles - 3 * k * (k - 1) - 2
+    kk = maximum(k, 1)
+    j, m = divmod(p, kk)
+    j[k == 0] = 0
+    m += 1
+    m[k == 0] = 0
+    return tuple(
+            (k * _corner[:, axis].take(j) + m * _neighbor[:, axis].take(j))
+            .astype(int32)
+            for axis in range(3))
+
+def rgbsTile(R, G, B):
+    """Vectorized rgbTile over arrays of RGB coordinates."""
+    R, G, B = (asarray(v, dtype=int64) for v in (R, G, B))
+    k = maximum(maximum(abs(R), abs(G)), abs(B))
+    conditions = [
+            k == 0,
+            (G == -k) & (1 <= R),
+            (R == k) & (G <= 0),
+            (B == -k) & (1 <= G),
+            (G == k) & (R <= -1),
+            (R == -k) & (G <= k - 1),
+            ]
+    sides = select(conditions, [0, 0, 1, 2, 3, 4], 5)
+    steps = select(conditions, [0, R, G + k, G, -R, k - G], R + k)
+    tiles = where(k == 0, 1, 3 * k * (k - 1) + 1 + sides * k + steps)
+    return tiles.astype(int32)
+
+if __name__ == "__main__":
+
+    from timeit import (default_timer)
+
+    def walk(radius):
+        """The original nested-loop walk of generateRings, for comparison."""
+        rgbs = [(0, 0, 0)]
+        for ring in range(1, radius+1):
+            r, g, b = 0, -ring, ring
+            for j in range(6):
+                for k in range(ring):
+                    r, g, b = r+neighbor[j][0], g+neighbor[j][1], b+neighbor[j][2]
+                    rgbs += [(r, g, b)]
+        return rgbs
+
+    radius = 12
+    rgbs = walk(radius)
+    tiles = arange(1, fullRing(radius)+1)
+    R, G, B = tilesRGB(tiles)
+    assert zip(R, G, B) == rgbs
+    assert list(rgbsTile(R, G, B)) == list(tiles)
+    for tile, rgb in enumerate(rgbs, 1):
+        assert tileRGB(tile) == rgb
+        assert rgbTile(*rgb) == tile
+        assert tileRing(tile) == rgbRing(*rgb)
+    assert [radiusFor(n) for n in [1, 2, 7, 8, 19, 20]] == [0, 1, 1, 2, 2, 3]
+    print 'spiral matches generateRings walk for radius', radius
+
+    for radius in [100, 577]:
+        t0 = default_timer()
+        tiles = arange(1, fullRing(radius)+1, dtype=int32)
+        R, G, B = tilesRGB(tiles)
+        ring = tilesRing(tiles)
+        t1 = default_timer()
+        assert (rgbsTile(R, G, B) == tiles).all()
+        print '%8d tiles: geometry in %.1f ms' % (len(tiles), 1e3*(t1-t0))
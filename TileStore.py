@@ -0,0 +1,446 @@
+#!/usr/bin/env python
+
+"""
+TileStore.py
+
+Array-backed storage for the tiles of a HexTile mesh.
+
+Each per-tile field (R, G, B, ring, strand, group, moved) is one
+parallel int32 column indexed directly by tile number.
+Slot 0 of every column is unused so that tile numbers, which begin with 1,
+index the columns without adjustment.
+A further int32 column, tile, is the strand-to-tile inverse
+(tile[s] is the tile currently holding strand s).
+A packed Occupancy bitmap, occupancy, marks the tiles holding a strand;
+occupy() rebuilds it after the strand column is written wholesale.
+
+The store keeps the historical HexTile access pattern as a thin view:
+    store[n]  (n > 0) returns a TileView record for tile n;
+    store[-n] (n > 0) returns the tile number holding strand n.
+TileView behaves like the old Dictionary record,
+including the functor call elements(['R','G','B']);
+a write through it is reported to store.touched, if set,
+so that an owner (see HexTile.touch) can follow changes.
+Rings maps ring numbers to lazy RingView sequences of TileViews,
+replacing the dict of record lists that HexTile once built.
+
+The store also answers spatial queries (tile_at, neighbors and their
+batched forms) through the shared HexIndex of its radius,
+restricted to the tiles the store actually holds,
+and carries the shared read-only NeighborTable of its radius as table.
+
+Nothing is allocated when a store is made.
+Each column, the occupancy bitmap, and the shared index and table
+are built on first access and then kept (see materialize).
+Until its column exists, a field read through a TileView comes from the
+closed-form spiral (see Spiral.py), so a few queries on a huge mesh
+cost O(1) and memory grows only with the columns actually used.
+
+Run this module to compare memory and throughput with the dict layout.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from numpy import (asarray, zeros, arange, where, flatnonzero, int32, int64)
+
+from Spiral import (radiusFor, ringTiles, tileRing, tileRGB, tilesRing, tilesRGB)
+from HexIndex import (HexIndex)
+from NeighborTable import (NeighborTable)
+from Occupancy import (Occupancy)
+from Groups import (members)
+from Permutation import (Permutation)
+
+class TileView(object):
+    """
+    TileView is a record-like window onto one row of a TileStore.
+    Reads and writes go straight through to the store columns.
+
+    The strand column holds positive strand numbers (0 for an empty tile)
+    but, as in the original Dictionary records,
+    the 'strand' key reads and writes negative strand numbers.
+    """
+    __slots__ = ('store', 'number')
+
+    def __init__(self, store, number):
+        self.store = store
+        self.number = number
+
+    def __getitem__(self, key):
+        value = self.store.value(key, self.number)
+        return -value if key == 'strand' else value
+
+    def __setitem__(self, key, value):
+        if key == 'strand':
+            value = -value
+        getattr(self.store, key)[self.number] = value
+        if self.store.touched is not None:
+            self.store.touched([self.number])
+
+    def __call__(self, keys=[], **kw):
+        """
+        Functor:
+        updates values for kw key/value pairs
+        returns values for keys
+        """
+        self.update(kw)
+        return [self[key] for key in keys]
+
+    def __eq__(self, other):
+        return dict(self.items()) == dict(other.items())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def get(self, key, default=None):
+        return self[key] if key in TileStore.fields else default
+
+    def keys(self):
+        return list(TileStore.fields)
+
+    def items(self):
+        return [(key, self[key]) for key in TileStore.fields]
+
+    def update(self, kw):
+        for key, value in kw.items():
+            self[key] = value
+
+class RingView(object):
+    """
+    RingView is a lazy sequence of the TileViews of one ring of a store.
+    Records are made only as they are indexed or iterated,
+    and the tiles listed are those the store holds at that moment.
+    """
+    __slots__ = ('store', 'number')
+
+    def __init__(self, store, number):
+        self.store = store
+        self.number = number
+
+    def tiles(self):
+        return self.store.ringTiles(self.number)
+
+    def __len__(self):
+        return len(self.tiles())
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return [TileView(self.store, t) for t in self.tiles()[n].tolist()]
+        return TileView(self.store, int(self.tiles()[n]))
+
+    def __iter__(self):
+        for tile in self.tiles().tolist():
+            yield TileView(self.store, tile)
+
+class Rings(object):
+    """
+    Rings maps ring numbers 0..radius to RingViews of a store,
+    replacing the dict of record lists that HexTile once built eagerly.
+    """
+    __slots__ = ('store',)
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return self.store.radius + 1
+
+    def __contains__(self, ring):
+        return 0 <= ring <= self.store.radius
+
+    has_key = __contains__
+
+    def __getitem__(self, ring):
+        if not ring in self:
+            raise KeyError(ring)
+        return RingView(self.store, ring)
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def keys(self):
+        return range(len(self))
+
+    def values(self):
+        return [self[ring] for ring in self]
+
+    def items(self):
+        return [(ring, self[ring]) for ring in self]
+
+class TileStore(object):
+    """
+    TileStore holds all tile records of one mesh in parallel int32 columns.
+    """
+
+    fields = ('R', 'G', 'B', 'ring', 'strand', 'group', 'moved')
+    geometry = ('R', 'G', 'B', 'ring')
+    columns = fields + ('tile', 'occupancy', 'index', 'table')
+    touched = None # called with the tiles written through a TileView
+
+    def __init__(self, tiles, geometry=None, strands=0):
+        """
+        A store for tiles 1..tiles with strands 1..strands
+        on the same-numbered tiles and an identity strand-to-tile inverse.
+        If geometry is another store of the same size,
+        its R, G, B and ring columns are shared rather than allocated.
+        Nothing is allocated here; see materialize().
+        """
+        self.tiles = tiles
+        self.strands = strands
+        self.radius = radiusFor(tiles)
+        self.shared = geometry is not None
+        if self.shared:
+            assert len(geometry) == tiles
+        self.geometrySource = geometry
+
+    def __getattr__(self, name):
+        """
+        Columns, the occupancy bitmap and the shared index and table
+        are made on first access and then held as plain attributes,
+        so later access costs nothing extra.
+        """
+        if name in TileStore.columns:
+            return self.materialize(name)
+        raise AttributeError(name)
+
+    def materialize(self, name):
+        """Build and keep one lazily made attribute (see __getattr__)."""
+        tiles = arange(self.tiles+1, dtype=int32)
+        if name == 'index':
+            value = HexIndex.of(self.radius)
+        elif name == 'table':
+            value = NeighborTable.of(self.radius)
+        elif name == 'occupancy':
+            value = Occupancy.of(self.strand)
+        elif name == 'tile':
+            value = tiles
+        elif name == 'strand':
+            value = where(tiles <= self.strands, tiles, 0).astype(int32)
+        elif name in TileStore.geometry and self.shared:
+            value = getattr(self.geometrySource, name)
+        elif name == 'ring':
+            value = zeros(self.tiles+1, dtype=int32)
+            value[1:] = tilesRing(tiles[1:])
+        elif name in 'RGB':
+            for axis, column in zip('RGB', tilesRGB(tiles[1:])):
+                value = zeros(self.tiles+1, dtype=int32)
+                value[1:] = column
+                setattr(self, axis, value)
+            return getattr(self, name)
+        else:
+            value = zeros(self.tiles+1, dtype=int32)
+        setattr(self, name, value)
+        return value
+
+    def value(self, key, n):
+        """
+        One field of one tile, from its column if that has been made,
+        otherwise from the closed form, without making the column.
+        """
+        column = self.__dict__.get(key, None)
+        if column is not None:
+            return int(column[n])
+        if key in TileStore.geometry:
+            if self.shared:
+                return self.geometrySource.value(key, n)
+            return tileRing(n) if key == 'ring' else tileRGB(n)['RGB'.index(key)]
+        if key == 'strand':
+            return n if n <= self.strands else 0
+        if key == 'tile':
+            return n
+        return 0
+
+    def values(self, key, tiles):
+        """Batched value over an array of tiles, also without the column."""
+        column = self.__dict__.get(key, None)
+        if column is not None:
+            return column[tiles]
+        tiles = asarray(tiles, dtype=int64)
+        if key in TileStore.geometry:
+            if self.shared:
+                return self.geometrySource.values(key, tiles)
+            if key == 'ring':
+                return tilesRing(tiles)
+            return tilesRGB(tiles)['RGB'.index(key)]
+        if key == 'strand':
+            return where(tiles <= self.strands, tiles, 0)
+        if key == 'tile':
+            return tiles
+        return zeros(tiles.shape, dtype=int32)
+
+    def occupy(self):
+        """Rebuild the occupancy bitmap from the strand column."""
+        self.occupancy = Occupancy.of(self.strand)
+        return self.occupancy
+
+    def occupied(self):
+        """Sorted tile numbers holding a strand."""
+        return flatnonzero(self.strand)
+
+    def __len__(self):
+        return self.tiles
+
+    def __contains__(self, n):
+        return n != 0 and abs(n) <= self.tiles
+
+    def __getitem__(self, n):
+        """
+        Positive numbers are cardinal tile numbers and return a TileView.
+        Negative numbers are tubulin fiber numbers and return a tile number.
+        """
+        if not n in self:
+            raise KeyError(n)
+        if n < 0:
+            return self.value('tile', -n)
+        return TileView(self, n)
+
+    def __setitem__(self, n, value):
+        """
+        self[-strand] = tile places a strand,
+        self[tile] = record copies every field of a record into the columns.
+        """
+        if not n in self:
+            raise KeyError(n)
+        if n < 0:
+            self.tile[-n] = value
+        else:
+            TileView(self, n).update(dict(value.items()))
+
+    def ringTiles(self, ring):
+        """Tile numbers of a ring held by this store."""
+        tiles = ringTiles(ring)
+        return tiles[tiles <= self.tiles]
+
+    def tile_at(self, R, G, B):
+        """Tile number at an RGB coordinate, or 0 if not held here."""
+        tile = self.index.tile_at(R, G, B)
+        return tile if tile <= self.tiles else 0
+
+    def tiles_at(self, R, G, B):
+        """Batched tile_at over coordinate arrays."""
+        tiles = self.index.tiles_at(R, G, B)
+        tiles[tiles > self.tiles] = 0
+        return tiles
+
+    def neighbors(self, tile):
+        """Neighbors of a tile held by this store."""
+        return [n for n in self.index.neighbors(tile) if n <= self.tiles]
+
+    def neighbors_of(self, tiles):
+        """Batched neighbors: (n, 6) int32 array, 0 for absent neighbors."""
+        table = self.index.neighbors_of(tiles)
+        table[table > self.tiles] = 0
+        return table
+
+    def displace(self, flat, offsets):
+        """
+        Move the occupants of groups (cycles and chains alike,
+        see Groups.py) one step as a single tile permutation,
+        recording group and position on every destination tile.
+        Displacements rarely recur, so they are not cached.
+        """
+        permutation = Permutation.ofGroups(flat, offsets, self.tiles, cache=False)
+        permutation.applyTo(self)
+        group, moved = members(offsets)
+        destination = permutation(flat)
+        self.group[destination] = group
+        self.moved[destination] = moved
+        return self
+
+    @property
+    def nbytes(self):
+        """Total bytes held by the columns made so far."""
+        names = TileStore.fields + ('tile', 'occupancy')
+        return sum(self.__dict__[name].nbytes
+                for name in names if name in self.__dict__)
+
+if __name__ == "__main__":
+
+    from sys import (getsizeof)
+    from timeit import (default_timer)
+
+    def dictLayout(tiles):
+        """Build the historical dict-of-records layout for comparison."""
+        layout = {}
+        for n in range(1, tiles+1):
+            layout[n] = dict(R=n, G=-n, B=0, ring=0, strand=-n, group=0, moved=0)
+            layout[-n] = n
+        return layout
+
+    def dictBytes(layout):
+        """Deep size of the dict layout (containers, records and values)."""
+        total = getsizeof(layout)
+        for key, value in layout.items():
+            total += getsizeof(key)
+            if isinstance(value, dict):
+                total += getsizeof(value)
+                total += sum(getsizeof(v) for v in value.values())
+            else:
+                total += getsizeof(value)
+        return total
+
+    def timed(function):
+        t0 = default_timer()
+        function()
+        return default_timer() - t0
+
+    print '%8s %14s %14s %10s %12s %12s' % (
+            'tiles', 'dict bytes', 'array bytes', 'ratio',
+            'dict sweep', 'array sweep')
+    for tiles in [10**3, 10**4, 10**5]:
+        layout = dictLayout(tiles)
+        store = TileStore(tiles)
+        store.R[1:] = arange(1, tiles+1)
+        store.G[1:] = -arange(1, tiles+1)
+        store.strand[1:] = arange(1, tiles+1)
+
+        def dictSweep():
+            for n in range(1, tiles+1):
+                layout[layout[-n]]['moved'] += layout[n]['R']
+
+        def arraySweep():
+            store.moved[store.tile[1:]] += store.R[1:]
+
+        dictBytes_ = dictBytes(layout)
+        dictTime, arrayTime = timed(dictSweep), timed(arraySweep)
+        for name in TileStore.fields + ('tile', 'occupancy'):
+            getattr(store, name)
+        print '%8d %14d %14d %10.1f %11.4fs %11.6fs' % (
+                tiles, dictBytes_, store.nbytes,
+                float(dictBytes_)/store.nbytes, dictTime, arrayTime)
+
+    # The compatibility view must agree with a record built the old way.
+    store = TileStore(7)
+    store[3] = dict(R=1, G=0, B=-1, ring=1, strand=-3, group=0, moved=0)
+    assert store[3](['R', 'G', 'B', 'strand']) == [1, 0, -1, -3]
+    assert store[-3] == 3
+    store[3]['strand'] = -5
+    store[-5] = 3
+    assert store.strand[3] == 5 and store[-5] == 3
+
+    # A lazy store answers point queries without building its columns.
+    from Spiral import (fullRing)
+    tiles = fullRing(577)
+    t0 = default_timer()
+    store = TileStore(tiles, strands=tiles)
+    view = store[tiles]
+    t1 = default_timer()
+    assert view(['R', 'G', 'B', 'ring', 'strand']) == [0, -577, 577, 577, -tiles]
+    assert store[-tiles] == tiles and store.nbytes == 0
+    t2 = default_timer()
+    assert (store.G[[1, tiles]] == [0, -577]).all() and store.nbytes == 12*(tiles+1)
+    t3 = default_timer()
+    print '%d tiles: store in %.1f us, geometry on first use in %.1f ms' % (
+            tiles, 1e6*(t1-t0), 1e3*(t3-t2))
+    rings = Rings(store)
+    assert len(rings) == 578 and len(rings[577]) == 6 * 577
+    assert rings[1][0] == store[2] and [v.number for v in rings[1][4:]] == [6, 7]
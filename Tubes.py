@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+
+"""
+Tubes.py
+
+Streaming export of strand trajectories as 3D tubes (OBJ or binary STL),
+toward printing the tubulin tree with each strand its own colour.
+
+Each strand of an axon (see Axon.py, LayerFile.py) is a path through the
+tile centers (see Buffers.centers) of successive layers, pitch apart in z.
+A regular polygon of sides corners and the given radius is swept along it:
+at every layer a ring of corners is set square to the path
+(the tangent is the central difference of the neighbouring layers),
+consecutive rings are joined by quads (two triangles in STL),
+and both ends are capped.
+
+Work is cut into chunks of a batch of strands by a block of layers.
+The trajectory of a batch is walked one permutation row at a time
+(LayerStack and LayerFile alike offer row(L)), and each chunk is
+handed, as just its tiles, to a worker that returns its text or bytes;
+chunks are written to the sink in order, a few in flight at a time,
+so neither the mesh nor the trajectories are ever held whole:
+    export(LayerFile('weave.axon'), open('weave.obj', 'w'), workers=8)
+OBJ vertices carry an RGB colour per strand (v x y z r g b)
+and each strand is its own group; STL has one solid.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from itertools import (imap, islice)
+from multiprocessing import (Pool)
+from struct import (pack)
+from numpy import (arange, asarray, concatenate, cos, cross, dtype)
+from numpy import (empty, pi, sin, sqrt, stack, zeros, float64, int32)
+from numpy import (int64)
+
+from Spiral import (tilesRGB)
+
+s3o2 = sqrt(3.0) / 2.0
+facet = dtype([('normal', '<f4', 3), ('corners', '<f4', (3, 3)), ('attribute', '<u2')])
+
+def points(tiles, layers, pitch, txy=[1.5, 1.0]):
+    """Path points (..., 3): tile centers (see HexTile.xys) at layer * pitch."""
+    R, G, B = tilesRGB(asarray(tiles, dtype=int64).ravel())
+    xyz = empty((R.size, 3), dtype=float64)
+    xyz[:, 0] = R * txy[0]
+    xyz[:, 1] = (B - G) * s3o2 * txy[1]
+    xyz = xyz.reshape(asarray(tiles).shape + (3,))
+    xyz[..., 2] = asarray(layers)[:, None] * pitch
+    return xyz
+
+def colours(strands):
+    """A distinct RGB colour per strand (hues a golden angle apart)."""
+    hue = (asarray(strands) * 0.6180339887) % 1.0 * 6
+    ramp = lambda shift: (abs((hue + shift) % 6 - 3) - 1).clip(0, 1)
+    return stack([ramp(0), ramp(4), ramp(2)], -1)
+
+def rings(before, tiles, after, first, pitch, sides, radius):
+    """
+    Corners of the rings of a chunk, (strands, layers, sides, 3),
+    from the tiles of its layers (layers, strands) and of the layers
+    just before and after it (None at the ends of the tubes).
+    """
+    layers = arange(first, first + len(tiles))
+    path = points(tiles, layers, pitch)
+    ahead = path[1:] if after is None else concatenate(
+            (path[1:], points(after[None], layers[-1:] + 1, pitch)))
+    behind = path[:-1] if before is None else concatenate(
+            (points(before[None], layers[:1] - 1, pitch), path[:-1]))
+    if after is None:
+        ahead = concatenate((ahead, path[-1:]))
+    if before is None:
+        behind = concatenate((path[:1], behind))
+    tangent = ahead - behind
+    tangent /= sqrt((tangent ** 2).sum(-1))[..., None]
+    # z always climbs, so the tangent is never along y.
+    u = cross([0.0, 1.0, 0.0], tangent)
+    u /= sqrt((u ** 2).sum(-1))[..., None]
+    v = cross(tangent, u)
+    angle = arange(sides) * (2 * pi / sides)
+    corners = path[:, :, None] + radius * (
+            cos(angle)[:, None] * u[:, :, None] + sin(angle)[:, None] * v[:, :, None])
+    return corners.transpose(1, 0, 2, 3)
+
+def objChunk(job):
+    """Worker: OBJ text of one chunk (see export)."""
+    (strands, before, tiles, after, first, last, offset, previous,
+            pitch, sides, radius) = job
+    corners = rings(before, tiles, after, first, pitch, sides, radius)
+    n, m = corners.shape[:2]
+    colour = colours(strands)[:, None, None] + zeros(corners.shape)
+    vertex = concatenate((corners, colour), -1).reshape(-1, 6)
+    text = [('v %.4f %.4f %.4f %.3f %.3f %.3f\n' * len(vertex)) % tuple(vertex.ravel())]
+    # 1-based index of corner k of ring (strand j, layer i of this chunk).
+    index = offset + 1 + arange(n * m * sides).reshape(n, m, sides)
+    if before is not None:
+        index = concatenate((previous[:, None], index), 1)
+    k = arange(sides)
+    for j in range(n):
+        ring = index[j]
+        quads = stack([ring[:-1, k], ring[:-1, (k+1) % sides],
+                ring[1:, (k+1) % sides], ring[1:, k]], -1).reshape(-1, 4)
+        text += ['g strand%d\n' % strands[j]]
+        text += [('f %d %d %d %d\n' * len(quads)) % tuple(quads.ravel())]
+        if before is None:
+            text += ['f' + ' %d' * sides % tuple(ring[0, ::-1]) + '\n']
+        if last:
+            text += ['f' + ' %d' * sides % tuple(ring[-1]) + '\n']
+    return ''.join(text)
+
+def stlChunk(job):
+    """Worker: binary STL facets of one chunk (see export)."""
+    (strands, before, tiles, after, first, last, offset, previous,
+            pitch, sides, radius) = job
+    corners = rings(before, tiles, after, first, pitch, sides, radius)
+    if before is not None:
+        corners = concatenate((previous[:, None], corners), 1)
+    k, k1 = arange(sides), (arange(sides) + 1) % sides
+    a, b = corners[:, :-1], corners[:, 1:]
+    walls = [stack([a[:, :, k], a[:, :, k1], b[:, :, k1]], -2),
+             stack([a[:, :, k], b[:, :, k1], b[:, :, k]], -2)]
+    fan = arange(1, sides - 1)
+    if before is None:
+        ring = corners[:, 0]
+        walls += [stack([ring[:, [0] * (sides - 2)], ring[:, fan + 1],
+                ring[:, fan]], -2)]
+    if last:
+        ring = corners[:, -1]
+        walls += [stack([ring[:, [0] * (sides - 2)], ring[:, fan],
+                ring[:, fan + 1]], -2)]
+    triangles = concatenate([wall.reshape(-1, 3, 3) for wall in walls])
+    facets = zeros(len(triangles), dtype=facet)
+    normal = cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    facets['normal'] = normal / sqrt((normal ** 2).sum(-1))[:, None]
+    facets['corners'] = triangles
+    return facets.tobytes()
+
+def walk(source, strands, start, stop, block, first=None):
+    """
+    Tiles of strands layer by layer, in blocks: yields (a, before, tiles,
+    after) for layers a..b-1, with the tiles of layers a-1 and b
+    (None beyond start..stop-1).
+    """
+    tiles = asarray(strands if first is None else first, dtype=int32)
+    for L in range(1, start + 1):
+        tiles = source.row(L).take(tiles)
+    before = None
+    for a in range(start, stop, block):
+        b = min(a + block, stop)
+        path = empty((b - a, len(tiles)), dtype=int32)
+        path[0] = tiles
+        for n in range(1, b - a):
+            path[n] = source.row(a + n).take(path[n-1])
+        after = source.row(b).take(path[-1]) if b < stop else None
+        yield a, before, path, after
+        before, tiles = path[-1], after
+
+def export(source, sink, strands=None, start=0, stop=None, form='obj',
+        sides=6, radius=0.25, pitch=2.0, batch=256, block=256, workers=1):
+    """
+    Write the tubes of strands (default: every strand) through layers
+    start..stop-1 of source (a LayerStack or LayerFile) to sink
+    as 'obj' text or binary 'stl'.  Strands start on their own tiles
+    in layer 0 (or those of source.base, if it has one,
+    whose vacancies are not strands).
+    Returns the count of facets (OBJ faces or STL triangles) written.
+    """
+    assert form in ('obj', 'stl')
+    stop = len(source) if stop is None else stop
+    assert 0 <= start < stop <= len(source)
+    base = getattr(source, 'base', None)
+    strands = arange(1, (base.store.strands if base else source.tiles) + 1,
+            dtype=int32) if strands is None else asarray(strands, dtype=int32)
+    layers = stop - start
+    if form == 'obj':
+        faces = len(strands) * (sides * (layers - 1) + 2)
+        sink.write('# %d strands, layers %d..%d, %d faces\n' % (
+                len(strands), start, stop-1, faces))
+    else:
+        faces = len(strands) * (2 * sides * (layers - 1) + 2 * (sides - 2))
+        sink.write(('tubes of %d strands' % len(strands)).ljust(80)[:80])
+        sink.write(pack('<I', faces))
+
+    def jobs():
+        offset = 0
+        for s in range(0, len(strands), batch):
+            some = strands[s:s+batch]
+            first = base.store.tile[some] if base else None
+            previous = None
+            for a, before, tiles, after in walk(source, some, start, stop,
+                    block, first):
+                last = after is None
+                yield (some, before, tiles, after, a, last, offset, previous,
+                        pitch, sides, radius)
+                if form == 'obj':
+                    count = len(some) * len(tiles) * sides
+                    previous = offset + 1 + arange(count).reshape(
+                            len(some), len(tiles), sides)[:, -1]
+                    offset += count
+                else:
+                    # The last ring, as the worker computes it.
+                    behind = tiles[-2] if len(tiles) > 1 else before
+                    previous = rings(behind, tiles[-1:], after,
+                            a + len(tiles) - 1, pitch, sides, radius)[:, 0]
+
+    work = objChunk if form == 'obj' else stlChunk
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        queue = jobs()
+        while True:
+            # Only a few chunks per worker are in flight at once.
+            some = list(islice(queue, 4 * max(workers, 1)))
+            if not some:
+                break
+            for chunk in (pool.imap(work, some) if pool else imap(work, some)):
+                sink.write(chunk)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return faces
+
+if __name__ == "__main__":
+
+    from os import (remove, rmdir, path as ospath)
+    from tempfile import (mkdtemp)
+    from cStringIO import (StringIO)
+    from resource import (getrusage, RUSAGE_SELF)
+    from timeit import (default_timer)
+    from numpy import (frombuffer, diff)
+    from HexTile import (HexTile)
+    from Axon import (LayerStack)
+    from LayerFile import (LayerFile)
+    from Weave import (weave)
+    from Spiral import (fullRing)
+
+    radius = 4
+    tiles = fullRing(radius)
+    kw = {'--Rings': '0', '--Tiles': str(tiles), '--tubulin': str(tiles),
+          '--rotate': False, '--label': False}
+    woven = weave(LayerStack(HexTile(**kw)), 12, seed=5)
+
+    # Workers change nothing; chunking changes only the order of the
+    # vertices and facets, not the surface.
+    def surface(form, data):
+        if form == 'stl':
+            return sorted(frombuffer(data[84:], dtype=facet)['corners'].reshape(
+                    -1, 9).tolist())
+        lines = data.splitlines()
+        vertex = [line for line in lines if line.startswith('v ')]
+        return sorted(tuple(sorted(vertex[int(i) - 1] for i in line.split()[1:]))
+                for line in lines if line.startswith('f '))
+
+    outputs = {}
+    for form in ['obj', 'stl']:
+        surfaces = []
+        for batch, block in [(1000, 1000), (7, 5), (10, 3)]:
+            data = set()
+            for workers in [1, 3]:
+                sink = StringIO()
+                export(woven, sink, form=form, batch=batch, block=block,
+                        workers=workers)
+                data.add(sink.getvalue())
+            assert len(data) == 1, (form, batch, block)
+            outputs[form] = data.pop()
+            surfaces += [surface(form, outputs[form])]
+        assert surfaces[0] == surfaces[1] == surfaces[2], form
+
+    # Every OBJ face index is a vertex; faces close every tube.
+    text = outputs['obj']
+    vertices = text.count('\nv ')
+    assert vertices == tiles * 13 * 6
+    indices = [int(i) for line in text.splitlines() if line.startswith('f ')
+            for i in line.split()[1:]]
+    assert min(indices) == 1 and max(indices) == vertices
+
+    # STL: the header count is the facet count, and the facets enclose
+    # a positive volume (they face outward), about that of the tubes.
+    data = outputs['stl']
+    facets = frombuffer(data[84:], dtype=facet)
+    assert len(facets) == frombuffer(data[80:84], dtype='<u4')[0]
+    a, b, c = (facets['corners'][:, n].astype(float64) for n in range(3))
+    volume = (a * cross(b, c)).sum() / 6
+    path = points(woven.trajectory(arange(1, tiles+1)), arange(13), 2.0)
+    length = sqrt((diff(path, axis=0) ** 2).sum(-1)).sum()
+    area = 6 * 0.25 ** 2 * sin(pi / 3) / 2
+    assert 0.8 < volume / (area * length) < 1.0
+    print '%d OBJ vertices, %d STL facets enclosing %.1f (tubes %.1f)' % (
+            vertices, len(facets), volume, area * length)
+
+    # A partly filled mesh: vacancies are not tubes, even when a chain
+    # sends one back two tiles to the start of the chain.
+    kw.update({'--Tiles': '19', '--tubulin': '7'})
+    h = HexTile(**kw)
+    step = [n for n in h.neighbors(7) if n > 7][0]
+    end = [n for n in h.neighbors(step) if n > 7 and n not in h.neighbors(7)][0]
+    partial = weave(LayerStack(h), 4, seed=2).appendGroups([[7, step, end]])
+    sink = StringIO()
+    export(partial, sink)
+    assert sink.getvalue().startswith('# 7 strands, layers 0..5')
+    assert sink.getvalue().count('\nv ') == 7 * 6 * 6
+    path = points(partial.trajectory(arange(1, 8)), arange(6), 2.0)
+    assert (sqrt((diff(path[..., :2], axis=0) ** 2).sum(-1)) < 1.8).all()
+
+    # Streaming from a layer file: memory is bounded by the chunk size.
+    folder = mkdtemp()
+    name = ospath.join(folder, 'weave.axon')
+    radius = 30
+    tiles = fullRing(radius)
+    with LayerFile.create(name, radius, tiles, seed=2) as axon:
+        weave(axon, 200, seed=2)
+
+    class Count(object):
+        """A sink that only counts what it is sent."""
+        size = 0
+        def write(self, data):
+            self.size += len(data)
+
+    axon = LayerFile(name)
+    for form, workers in [('stl', 1), ('stl', 4), ('obj', 1), ('obj', 4)]:
+        before = getrusage(RUSAGE_SELF).ru_maxrss
+        t0 = default_timer()
+        sink = Count()
+        faces = export(axon, sink, form=form, batch=128, block=64, workers=workers)
+        t1 = default_timer()
+        print '%s, %d workers: %d strands x %d layers, %d facets, %d MB in %.1f s, %d kB peak growth' % (
+                form, workers, tiles, len(axon), faces, sink.size >> 20, t1-t0,
+                getrusage(RUSAGE_SELF).ru_maxrss - before)
+    remove(name)
+    rmdir(folder)
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+
+"""
+Verify.py
+
+Verification that no two strands cross between consecutive layers.
+
+Between layer L-1 and layer L every strand travels on a straight segment
+from its tile center to its new tile center (see Axon.py).
+Two strands on tiles a and b, moving to tiles a' and b', meet if their
+relative displacement D(t) = (a - b) + t((a' - a) - (b' - b))
+passes through zero for some t in [0, 1], that is, when
+D(0) = a - b and D(1) = a' - b' point in exactly opposite directions.
+Because every legal move is a single step to a neighboring tile (or none),
+only strands on neighboring tiles can meet,
+and for those, meeting means exchanging places.
+Cube coordinates are integers, so both tests are exact:
+    leap      a strand moved further than one tile;
+    crossing  two strands on neighboring tiles met (swapped or crossed).
+Only occupied tiles count: the vacancy at the end of a translation chain
+(see HexTile.translate) jumps back to the start of the chain unchecked.
+Every edge of the shared NeighborTable is examined at once per layer,
+and a stack is verified in blocks of layers across a process pool.
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from itertools import (imap, islice, izip)
+from multiprocessing import (Pool)
+from timeit import (default_timer)
+from numpy import (asarray, arange, empty, zeros, ones, repeat, diff)
+from numpy import (flatnonzero)
+from numpy import (int32, int64)
+
+from HexIndex import (HexIndex)
+from NeighborTable import (NeighborTable)
+from Spiral import (fullRing)
+
+class Crossing(object):
+    """
+    Crossing is the result of a verification.
+    It is true when no strand leapt and no strands met.
+    layer is the first offending layer (reached from layer-1),
+    tiles the offending tiles in layer-1 and strands their strands
+    (strands is filled in by verifyStack).
+    """
+
+    def __init__(self, layer=None, kind=None, tiles=None):
+        self.layer = layer
+        self.kind = kind
+        self.tiles = tiles
+        self.strands = None
+        self.layers = 0
+        self.seconds = 0.0
+
+    def __nonzero__(self):
+        return self.layer is None
+
+    __bool__ = __nonzero__
+
+    @property
+    def rate(self):
+        return self.layers / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        speed = '%d layers in %.3f s (%.0f layers/s)' % (
+                self.layers, self.seconds, self.rate)
+        if self:
+            return 'no crossings: ' + speed
+        return '%s at layer %d, tiles %s, strands %s: %s' % (
+                self.kind, self.layer, self.tiles, self.strands, speed)
+
+def edges(radius):
+    """Tile pairs (a, b), a < b, of every edge of the mesh."""
+    table = NeighborTable.of(radius)
+    a = repeat(arange(len(table.indptr) - 1), diff(table.indptr))
+    b = table.indices.astype(int64)
+    once = a < b
+    return a[once], b[once]
+
+def holding(rows, occupied):
+    """
+    Occupancy before each row of a block, as a bool array shaped like rows,
+    given the bool occupancy before the first row (None: all occupied).
+    """
+    if occupied is None:
+        return ones(rows.shape, dtype=bool)
+    held = empty(rows.shape, dtype=bool)
+    held[0] = occupied
+    for n in range(1, len(rows)):
+        held[n, rows[n-1]] = held[n-1]
+    return held
+
+def checkRows(rows, radius, first=1, occupied=None):
+    """
+    Check a block of permutation rows (one per layer, see Axon.py)
+    whose first row reaches layer first.
+    occupied is the bool occupancy of the tiles in layer first-1
+    (None when every tile holds a strand).
+    Returns a Crossing for the earliest violation in the block.
+    """
+    rows = asarray(rows)
+    index = HexIndex.of(radius)
+    table = NeighborTable.of(radius)
+    tiles = rows.shape[1] - 1
+    R, G, B = index.R, index.G, index.B
+    held = holding(rows, occupied)
+
+    # Leaps: every occupant moves to itself or to a neighbor,
+    # so adjacency is looked up for the occupants that moved only.
+    moving = (rows[:, 1:] != arange(1, tiles+1, dtype=int32)) & held[:, 1:]
+    layer, tile = moving.nonzero()
+    tile += 1
+    far = ~table.adjacents(tile, rows[layer, tile])
+    layer, tile = layer[far], tile[far]
+
+    # Crossings: opposite relative displacement across an edge,
+    # all in int32 (differences of cube coordinates are small).
+    a, b = edges(radius)
+    keep = b <= tiles
+    a, b = a[keep], b[keep]
+    dR0, dG0, dB0 = R[a] - R[b], G[a] - G[b], B[a] - B[b]
+    A, Bt = rows[:, a], rows[:, b]
+    dR1, dG1, dB1 = R[A] - R[Bt], G[A] - G[Bt], B[A] - B[Bt]
+    del A, Bt
+    crossed = (dR0 * dG1 - dG0 * dR1) == 0
+    crossed &= (dR0 * dR1 + dG0 * dG1 + dB0 * dB1) < 0
+    del dR1, dG1, dB1
+    crossed &= held[:, a]
+    crossed &= held[:, b]
+
+    bad = flatnonzero(crossed.any(1))
+    if not len(bad) and not len(layer):
+        return Crossing()
+    if len(layer) and (not len(bad) or layer[0] <= bad[0]):
+        n, t = int(layer[0]), int(tile[0])
+        return Crossing(first + n, 'leap', (t, int(rows[n, t])))
+    n = bad[0]
+    e = flatnonzero(crossed[n])[0]
+    return Crossing(first + n, 'crossing', (int(a[e]), int(b[e])))
+
+def verifyPair(before, after, radius, occupied=None):
+    """
+    Check two consecutive layer placements (int32 arrays mapping
+    layer 0 tiles to tiles, see LayerStack.placement);
+    occupied is the bool occupancy of layer 0.
+    """
+    before, after = asarray(before), asarray(after)
+    move = arange(len(before), dtype=int32)
+    move[before] = after
+    if occupied is not None:
+        held = zeros(len(before), dtype=bool)
+        held[before] = occupied
+        occupied = held
+    return checkRows(move[None, :], radius, 1, occupied)
+
+def rowsOf(stack, start, stop):
+    """Rows of layers start..stop-1 of a stack as one int32 array."""
+    stop = min(stop, len(stack))
+    rows = empty((stop - start, stack.tiles + 1), dtype=int32)
+    for n, layer in enumerate(range(start, stop)):
+        rows[n] = stack.row(layer)
+    return rows
+
+def verifyBlock(job):
+    """Worker: check the layers of one block."""
+    radius, first, rows, occupied = job
+    return checkRows(rows, radius, first, occupied)
+
+def carry(strand, rows):
+    """Strand on every tile after the rows, given strand before them."""
+    for row in rows:
+        after = empty(len(strand), dtype=strand.dtype)
+        after[row] = strand
+        strand = after
+    return strand
+
+def verifyStack(stack, workers=1, block=None, budget=64 << 20, base=None):
+    """
+    Verify every layer transition of a LayerStack (or LayerFile)
+    in blocks of layers, in parallel when workers > 1.
+    base is the HexTile of layer 0 (default stack.base).
+    block layers are checked at once, by default as many as keep
+    the temporaries of a block (about 128 bytes per tile and layer)
+    within budget bytes.
+    Stops at the first offending layer and names its strands.
+    """
+    t0 = default_timer()
+    base = stack.base if base is None else base
+    tiles = len(base)
+    if block is None:
+        block = max(1, budget // (128 * (tiles + 1)))
+    held = base.store.occupied()
+    sparse = len(held) < tiles
+    strand = zeros(tiles + 1, dtype=int32)
+    strand[held] = base.store.strand[held]
+
+    def jobs(strand):
+        # The strand on every tile is carried from block to block.
+        for first in range(1, len(stack), block):
+            rows = rowsOf(stack, first, first + block)
+            yield (stack.radius, first, rows, strand != 0 if sparse else None), strand
+            strand = carry(strand, rows)
+
+    pool = Pool(workers) if workers > 1 else None
+    result = Crossing()
+    try:
+        queue = jobs(strand)
+        while result:
+            # Only a few blocks per worker are in flight at once.
+            some = list(islice(queue, 4 * max(workers, 1)))
+            if not some:
+                break
+            work = [job for job, before in some]
+            results = pool.imap(verifyBlock, work) if pool else imap(verifyBlock, work)
+            for (job, before), found in izip(some, results):
+                if not found:
+                    # Strands on the offending tiles in the layer before.
+                    before = carry(before, job[2][:found.layer - job[1]])
+                    found.strands = tuple(int(before[t]) for t in found.tiles)
+                    result = found
+                    break
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+    if not result:
+        result.layers = result.layer - 1
+    else:
+        result.layers = len(stack) - 1
+    result.seconds = default_timer() - t0
+    return result
+
+if __name__ == "__main__":
+
+    from HexTile import (HexTile)
+    from Axon import (LayerStack)
+    from Weave import (weave)
+    from Permutation import (Permutation)
+    from Groups import (flatten)
+    from LayerFile import (LayerFile, save)
+    from os import (remove, rmdir, path as ospath)
+    from tempfile import (mkdtemp)
+
+    move = arange(8, dtype=int32)
+    assert checkRows(move[None, :], 1)
+    move[[1, 2]] = [2, 1]
+    found = checkRows(move[None, :], 1)
+    assert found.kind == 'crossing' and found.tiles == (1, 2)
+    move = arange(20, dtype=int32)
+    move[[1, 8]] = [8, 1]
+    assert checkRows(move[None, :], 2).kind == 'leap'
+
+    tiles = fullRing(57)
+    kw = {'--Rings': '0', '--Tiles': str(tiles), '--tubulin': str(tiles),
+          '--rotate': False, '--label': False}
+    stack = weave(LayerStack(HexTile(**kw)), 300, seed=3)
+    print verifyStack(stack, workers=2)
+
+    swap = arange(tiles+1, dtype=int32)
+    swap[[5, 6]] = [6, 5]
+    stack.append(Permutation(swap))
+    found = verifyStack(stack, workers=2)
+    assert not found and found.layer == 301
+    print found
+
+    # Any block size, and the same layers read from a file, agree.
+    folder = mkdtemp()
+    name = save(stack, ospath.join(folder, 'weave.axon'))
+    for again in [verifyStack(stack, block=7),
+            verifyStack(LayerFile(name), workers=2, base=stack.base)]:
+        assert (again.layer, again.tiles, again.strands) == (
+                found.layer, found.tiles, found.strands)
+    remove(name)
+    rmdir(folder)
+
+    # A translation into an empty tile is not a leap of its vacancy.
+    kw.update({'--Tiles': '19', '--tubulin': '7'})
+    sparse = LayerStack(HexTile(**kw))
+    sparse.appendGroups([[1, 2, 3]])
+    sparse.append(Permutation.ofGroups(*flatten([[3, 10, 9]]), tiles=19))
+    assert verifyStack(sparse)
+    assert not checkRows(sparse.row(2)[None, :], 2)
+
+    # Sparse and dense bases find the same crossing.
+    kw.update({'--Tiles': '37', '--tubulin': '10'})
+    for option in [False, True]:
+        kw['--sparse'] = option
+        crossed = LayerStack(HexTile(**kw)).appendGroups([[1, 2]])
+        found = verifyStack(crossed)
+        assert not found and found.kind == 'crossing' and found.layer == 1
+        assert sorted(found.strands) == [1, 2]
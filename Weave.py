@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""
+Weave.py
+
+Generation of long random weaves across a pool of processes.
+
+Each layer's rotation groups come from Cycles.py with its own random
+stream keyed by the pair (seed, layer number), so a layer does not
+depend on which worker made it or on what that worker made before.
+The woven stack is therefore bit-identical for any count of workers
+and any block size.
+
+Workers compile blocks of consecutive layers into int32 permutation
+rows and return them in order; the rows are appended to the
+LayerStack as they arrive, so only a few blocks are in flight at once.
+    stack = weave(LayerStack(base), layers=10000, workers=8, seed=1)
+"""
+
+__date__       = "20261018"
+__author__     = "jlettvin"
+__maintainer__ = "jlettvin"
+__email__      = "jlettvin@gmail.com"
+__copyright__  = "Copyright(c) 2016 Jonathan D. Lettvin, All Rights Reserved"
+__license__    = "GPLv3"
+__status__     = "Production"
+__version__    = "0.0.1"
+
+from itertools import (imap)
+from multiprocessing import (Pool)
+from numpy import (empty, int32)
+
+from Cycles import (Cycles)
+from Permutation import (Permutation)
+
+def layerCycles(radius, tiles, seed, layer, choice='random'):
+    """The rotation groups of one layer, from its own (seed, layer) stream."""
+    return getattr(Cycles(radius, [seed, layer], tiles), choice)()
+
+def weaveRows(job):
+    """
+    Worker: permutation rows for layers start..stop-1.
+    Returns (start, rows) with rows an int32 array of one row per layer.
+    """
+    radius, tiles, seed, choice, start, stop = job
+    rows = empty((stop - start, tiles + 1), dtype=int32)
+    for n, layer in enumerate(range(start, stop)):
+        flat, offsets = layerCycles(radius, tiles, seed, layer, choice)
+        rows[n] = Permutation.ofGroups(flat, offsets, tiles, cache=False).move
+    return start, rows
+
+def weave(stack, layers, workers=1, seed=0, choice='random', block=None):
+    """
+    Append a count of randomly rotated layers to stack and return it.
+    Layer numbers (and so random streams) continue from len(stack).
+    """
+    first, end = len(stack), len(stack) + layers
+    if block is None:
+        block = max(1, min(64, layers // (4 * max(workers, 1)) or 1))
+    jobs = [(stack.radius, stack.tiles, seed, choice, start,
+             min(start + block, end)) for start in range(first, end, block)]
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        results = pool.imap(weaveRows, jobs) if pool else imap(weaveRows, jobs)
+        for start, rows in results:
+            assert start == len(stack)
+            for row in rows:
+                stack.append(row)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return stack
+
+if __name__ == "__main__":
+
+    from timeit import (default_timer)
+    from HexTile import (HexTile)
+    from Axon import (LayerStack)
+
+    tiles = 1 + 3 * 57 * 58
+    kw = {'--Rings': '0', '--Tiles': str(tiles), '--tubulin': str(tiles),
+          '--rotate': False, '--label': False}
+    base = HexTile(**kw)
+    digests = set()
+    for workers, block in [(1, 7), (2, None), (4, 3)]:
+        t0 = default_timer()
+        stack = weave(LayerStack(base), 200, workers, seed=11, block=block)
+        t1 = default_timer()
+        digests.add(stack.digest())
+        print '%d workers: %d layers of %d tiles in %.2f s' % (
+                workers, len(stack) - 1, tiles, t1 - t0)
+    assert len(digests) == 1, 'weave depends on worker count'
+    print 'digest', digests.pop()
+
+    # Rings and triangles only, for comparison.
+    t0 = default_timer()
+    stack = weave(LayerStack(base), 200, seed=11, choice='scatter')
+    print 'scatter: %d layers of %d tiles in %.2f s' % (
+            len(stack) - 1, tiles, default_timer() - t0)